@@ -0,0 +1,139 @@
+import numpy as np
+from copy import deepcopy
+from block_ip import BlockIP
+from port import Port
+
+class ArrayLayout:
+    # Struct-of-arrays placement: the block, edge, position and length of every port live in flat
+    # NumPy arrays indexed by the port ids of the ConnectivityIndex, so full wirelength and overlap
+    # are computed in a few vectorized passes. Single moves do not touch NumPy beyond two element writes:
+    # every ArrayBlock keeps its ports and edge index as a BlockIP does and answers per-port queries from them.
+
+    def __init__(self, block_list, connectivity):
+        # Build the static tables and the mutable placement arrays from parsed BlockIP objects.
+        port_length = np.array([block.block_ports[port_index][0].get_port_length()
+                                for block in block_list
+                                for port_index in range(len(block.block_ports))], dtype=np.int64)
+        port_edge = np.array([edge for block in block_list for port, edge, pos in block.block_ports], dtype=np.int64)
+        port_pos = np.array([pos for block in block_list for port, edge, pos in block.block_ports], dtype=np.int64)
+        block_offsets = np.cumsum([0] + [len(ids) for ids in connectivity.port_ids], dtype=np.int64)
+        self.build(block_list, port_length, port_edge, port_pos, block_offsets,
+                   np.array(connectivity.offsets, dtype=np.int64), np.array(connectivity.neighbors, dtype=np.int64))
+
+    @classmethod
+    def from_arrays(cls, block_list, port_length, port_location, block_offsets, offsets, neighbors):
+        # Build a layout on the memory-mapped arrays of design_cache: the static tables are used in place
+        # and only the placement is copied.
+        obj = cls.__new__(cls)
+        obj.build(block_list, port_length, np.array(port_location[:, 0]), np.array(port_location[:, 1]), block_offsets,
+                  offsets, neighbors)
+        return obj
+
+    def build(self, block_list, port_length, port_edge, port_pos, block_offsets, offsets, neighbors):
+        # Set up the tables from per-port arrays numbered block by block, with the ports of block b at
+        # block_offsets[b]:block_offsets[b + 1], and the CSR nets of the ConnectivityIndex.
+        self.port_block = np.repeat(np.arange(len(block_list), dtype=np.int64), np.diff(block_offsets))
+        self.port_length = port_length
+        self.port_edge = port_edge
+        self.port_pos = port_pos
+        self.block_start = block_offsets[:-1]
+
+        # Edge tables, concatenated from the per-block geometry built by BlockIP.process_edges.
+        edge_offset = []
+        edge_block, edge_len, geometry = [], [], []
+        for block_index, block in enumerate(block_list):
+            edge_offset.append(len(edge_block))
+            for length, direct in block.edges:
+                edge_block.append(block_index)
+                edge_len.append(length)
+            geometry.extend(block.edge_geometry)
+        corner_x, corner_y, ux, uy, nx, ny = zip(*geometry) if geometry else ([],) * 6
+        self.edge_offset = np.array(edge_offset, dtype=np.int64)
+        self.edge_block = np.array(edge_block, dtype=np.int64)
+        self.corner_x = np.array(corner_x, dtype=np.int64)
+        self.corner_y = np.array(corner_y, dtype=np.int64)
+        self.ux = np.array(ux, dtype=np.int64)
+        self.uy = np.array(uy, dtype=np.int64)
+        self.nx = np.array(nx, dtype=np.int64)
+        self.ny = np.array(ny, dtype=np.int64)
+        self.edge_len = np.array(edge_len, dtype=np.int64)
+
+        # Nets in both directions, as in map_connectivity; total wirelength is half their sum.
+        self.net_src = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+        self.net_dst = neighbors
+
+        self.blocks = [ArrayBlock(block, self, block_index) for block_index, block in enumerate(block_list)]
+
+    def __deepcopy__(self, memo):
+        # Copy only the mutable placement arrays, sharing the static tables.
+        cls = self.__class__
+        obj = cls.__new__(cls)
+        memo[id(self)] = obj
+        obj.__dict__.update(self.__dict__)
+        obj.port_edge = self.port_edge.copy()
+        obj.port_pos = self.port_pos.copy()
+        obj.blocks = deepcopy(self.blocks, memo)
+        return obj
+
+    def global_edges(self):
+        # Return the global edge id of every port.
+        return self.edge_offset[self.port_block] + self.port_edge
+
+    def port_centers(self):
+        # Return the x and y coordinates of the center of every port.
+        edges = self.global_edges()
+        along = self.port_pos + self.port_length / 2.0
+        half_width = Port.port_width / 2.0
+        x = self.corner_x[edges] + along * self.ux[edges] + half_width * self.nx[edges]
+        y = self.corner_y[edges] + along * self.uy[edges] + half_width * self.ny[edges]
+        return x, y
+
+    def total_dist(self, is_HPWL=False):
+        # Total Euclidean distance or HPWL over all nets.
+        x, y = self.port_centers()
+        dx = x[self.net_dst] - x[self.net_src]
+        dy = y[self.net_dst] - y[self.net_src]
+        if is_HPWL:
+            return float((np.abs(dx) + np.abs(dy)).sum()) / 2.0
+        return float(np.hypot(dx, dy).sum()) / 2.0
+
+    def block_overlaps(self):
+        # Total pairwise port overlap of every block from one sweep over interval end points.
+        # On an edge with coverage count c(x), the integral of c(x)^2 counts every pair twice and
+        # every port once with its own length, so the pairwise overlap is (integral - lengths) / 2.
+        edges = self.global_edges()
+        points = np.concatenate((self.port_pos, self.port_pos + self.port_length))
+        point_edges = np.concatenate((edges, edges))
+        steps = np.concatenate((np.ones_like(edges), -np.ones_like(edges)))
+        order = np.lexsort((points, point_edges))
+        points, point_edges, steps = points[order], point_edges[order], steps[order]
+        coverage = np.cumsum(steps)[:-1]
+        segment = np.diff(points) * (point_edges[1:] == point_edges[:-1])
+        num_blocks = len(self.edge_offset)
+        squared = np.bincount(self.edge_block[point_edges[:-1]], weights=coverage * coverage * segment, minlength=num_blocks)
+        lengths = np.bincount(self.port_block, weights=self.port_length, minlength=num_blocks)
+        return np.rint((squared - lengths) / 2.0).astype(np.int64).tolist()
+
+class ArrayBlock(BlockIP):
+    # BlockIP whose placement is mirrored into an ArrayLayout, so state, MCTS and export_port_positions run
+    # unchanged. Moves and per-port coordinates use the inherited block_ports and edge index; the layout
+    # arrays only serve the vectorized full-cost passes.
+
+    def __init__(self, block, layout, block_index):
+        # Take over a parsed block, whose edge index and overlap cost are built, and point it at its slice of the layout.
+        self.__dict__.update(block.__dict__)
+        self.layout = layout
+        self.block_index = block_index
+        self.start = layout.block_start.item(block_index)
+
+    def __deepcopy__(self, memo):
+        # Copy the placement as BlockIP does and the layout at most once per deepcopy.
+        obj = BlockIP.__deepcopy__(self, memo)
+        obj.layout = deepcopy(self.layout, memo)
+        return obj
+
+    def place_port(self, port_id, new_edge, new_pos):
+        # Put a port at the given edge and position, updating the edge index and the layout arrays.
+        BlockIP.place_port(self, port_id, new_edge, new_pos)
+        self.layout.port_edge[self.start + port_id] = new_edge
+        self.layout.port_pos[self.start + port_id] = new_pos
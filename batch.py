@@ -0,0 +1,124 @@
+import io
+import os
+import sys
+import time
+import zlib
+import random
+import argparse
+import contextlib
+import multiprocessing
+from design_io import DesignFormatError
+
+def read_manifest(file_path):
+    # Return [blocks file, connectivity file, output file, time budget or None] for every row of a manifest.
+    # Rows are comma separated, blank lines and lines starting with '#' are skipped, and relative paths
+    # are taken relative to the manifest.
+    base = os.path.dirname(os.path.abspath(file_path))
+    jobs = []
+    with open(file_path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = [field.strip() for field in line.split(",")]
+            if len(fields) not in (3, 4) or not all(fields[:3]):
+                raise DesignFormatError(file_path, line_no, "expected 'blocks, connectivity, output[, time budget]'")
+            budget = None
+            if len(fields) == 4 and fields[3]:
+                try:
+                    budget = float(fields[3])
+                except ValueError:
+                    raise DesignFormatError(file_path, line_no, f"invalid time budget {fields[3]!r}") from None
+            jobs.append([os.path.join(base, field) for field in fields[:3]] + [budget])
+    return jobs
+
+def cache_path(cache_dir, blocks_file, ports_file):
+    # Design cache file shared by every job on the same pair of input files. Its block data is kept in a
+    # separate file keyed by the blocks file alone (design_cache.blocks_cache_path), shared by all variants.
+    key = zlib.crc32(f"{os.path.abspath(blocks_file)}\0{os.path.abspath(ports_file)}".encode())
+    return os.path.join(cache_dir, f"{os.path.basename(ports_file)}.{key:08x}.podesign")
+
+def prepare_caches(jobs, cache_dir, backend):
+    # Parse every distinct design once and write its cache, so workers memory map the parsed arrays and
+    # search on them in place; the nets and the array backend tables are shared pages, not per-worker copies.
+    # Returns the cache file of every job, None where the design could not be parsed so the job reports why.
+    from mcts import MCTS
+    os.makedirs(cache_dir, exist_ok=True)
+    caches = []
+    ready = {}
+    for blocks_file, ports_file, output_file, budget in jobs:
+        cache_file = cache_path(cache_dir, blocks_file, ports_file)
+        if cache_file not in ready:
+            try:
+                MCTS(backend=backend).load_design(blocks_file, ports_file, cache_file)
+                ready[cache_file] = cache_file
+            except (OSError, ValueError):
+                ready[cache_file] = None
+        caches.append(ready[cache_file])
+    return caches
+
+def init_worker():
+    # Import the optimizer once per worker process instead of once per job.
+    import mcts
+
+def run_job(job):
+    # Optimize one design in a worker and return [index, final cost or None, runtime, error message or None].
+    index, blocks_file, ports_file, output_file, cache_file, iterations, time_budget, seed, backend = job
+    import block_ip
+    from main import main
+    random.seed(seed)
+    block_ip.global_t = 1
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            final = main(blocks_file, ports_file, output_file, iterations=iterations, time_budget=time_budget,
+                         seed=seed, backend=backend, cache_file=cache_file)
+        return [index, final.get_total_cost(), time.perf_counter() - start, None]
+    except Exception as error:
+        return [index, None, time.perf_counter() - start, f"{type(error).__name__}: {error}"]
+
+def run_batch(manifest, workers=None, iterations=1000, time_budget=None, cache_dir=None, seed=0, backend="objects"):
+    # Run every job of a manifest on a pool of reused worker processes and print a summary table.
+    # Rows without their own time budget use time_budget. Returns [output file, cost, runtime, error] per job.
+    jobs = read_manifest(manifest)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(manifest)), ".design_cache")
+    caches = prepare_caches(jobs, cache_dir, backend)
+    tasks = [[index, blocks_file, ports_file, output_file, cache_file, iterations,
+              budget if budget is not None else time_budget, seed, backend]
+             for index, ((blocks_file, ports_file, output_file, budget), cache_file) in enumerate(zip(jobs, caches))]
+    results = [None] * len(jobs)
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers or os.cpu_count(), initializer=init_worker) as pool:
+        for index, cost, runtime, error in pool.imap_unordered(run_job, tasks):
+            results[index] = [jobs[index][2], cost, runtime, error]
+    print_summary(results, time.perf_counter() - start)
+    return results
+
+def print_summary(results, wall_time):
+    # Print the final cost and runtime of every job.
+    width = max([len("output")] + [len(os.path.relpath(output_file)) for output_file, cost, runtime, error in results])
+    print(f"{'output':<{width}}  {'cost':>14}  {'runtime (s)':>11}")
+    for output_file, cost, runtime, error in results:
+        cost_text = f"{cost:14.2f}" if error is None else f"{'FAILED':>14}"
+        print(f"{os.path.relpath(output_file):<{width}}  {cost_text}  {runtime:11.2f}" + (f"  {error}" if error else ""))
+    failed = sum(1 for result in results if result[3] is not None)
+    print(f"{len(results)} jobs, {failed} failed, {wall_time:.2f} seconds")
+
+def parse_args(argv=None):
+    # Parse the command line of the batch runner.
+    parser = argparse.ArgumentParser(description="Optimize the port placement of every design in a manifest.")
+    parser.add_argument("manifest", help="CSV rows of blocks file, connectivity file, output file[, time budget]")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("--iterations", type=int, default=1000, help="MCTS iterations per job")
+    parser.add_argument("--time-budget", type=float, default=None, help="seconds per job without its own budget")
+    parser.add_argument("--cache-dir", default=None, help="design cache directory, defaults to .design_cache next to the manifest")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of every job")
+    parser.add_argument("--backend", choices=["objects", "arrays"], default="objects", help="placement storage")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = run_batch(args.manifest, args.workers, args.iterations, args.time_budget, args.cache_dir, args.seed,
+                        args.backend)
+    sys.exit(1 if any(result[3] is not None for result in results) else 0)
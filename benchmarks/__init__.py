@@ -0,0 +1,2 @@
+# Synthetic design generator and speed benchmarks. Run from the repository root with
+# python -m benchmarks.run --help
@@ -0,0 +1,80 @@
+import random
+
+def block_outline(x0, y0, width, height, complexity, rng):
+    # Clockwise rectilinear outline starting at the bottom-left corner and going up, like the test
+    # designs: a staircase top with `complexity` steps down, ending at the bottom-right corner. The
+    # closing bottom edge is implied.
+    coords = [[x0, y0], [x0, y0 + height]]
+    x, y = x0, y0 + height
+    cuts = sorted(rng.sample(range(1, width), min(complexity, width - 1)))
+    for cut in cuts:
+        drop = rng.randint(1, max(1, (y - y0) // (complexity + 1)))
+        if y - drop <= y0:
+            break
+        x = x0 + cut
+        coords.append([x, y])
+        y -= drop
+        coords.append([x, y])
+    coords.append([x0 + width, y])
+    coords.append([x0 + width, y0])
+    return coords
+
+def generate_design(num_blocks=16, ports_per_block=8, nets=None, complexity=2, seed=0,
+                    block_size=(100, 400), gap=10, port_length=(10, 40), freq=(1, 20)):
+    # Seeded synthetic design: rows of blocks with `gap` units between neighbours and nets between ports of
+    # different blocks. Every port is used by at least one net; nets defaults to one per port.
+    rng = random.Random(seed)
+    columns = max(1, int(num_blocks ** 0.5 + 0.5))
+    blocks = []
+    below = []  # [x start, x end, top] of the blocks in the previous row
+    row_blocks = []
+    x = 0
+    for index in range(num_blocks):
+        if index % columns == 0:
+            below, row_blocks, x = row_blocks or below, [], 0
+        width = rng.randint(*block_size)
+        height = rng.randint(*block_size)
+        # Sit on the highest block below that overlaps this one horizontally.
+        y = max([top + gap for start, end, top in below if start < x + width and x < end], default=0)
+        blocks.append([f"blk_{index}", block_outline(x, y, width, height, complexity, rng)])
+        row_blocks.append([x, x + width, y + height])
+        x += width + gap
+
+    ports = [f"blk_{index}.port_{index}_{port}" for index in range(num_blocks) for port in range(ports_per_block)]
+    lengths = {port: rng.randint(*port_length) for port in ports}
+    order = ports[:]
+    rng.shuffle(order)
+    pairs = list(zip(order[0::2], order[1::2]))
+    if len(order) % 2:
+        pairs.append((order[-1], rng.choice(order[:-1])))
+    nets = len(ports) if nets is None else nets
+    while len(pairs) < nets:
+        pairs.append(tuple(rng.sample(ports, 2)))
+    connections = []
+    for pair in pairs:
+        if num_blocks > 1 and pair[0].split(".")[0] == pair[1].split(".")[0]:
+            # Keep nets between different blocks: connect both ports elsewhere instead.
+            pair = [(con, other_block_port(con, ports, rng)) for con in pair]
+        else:
+            pair = [pair]
+        for con1, con2 in pair:
+            connections.append([con1, con2, lengths[con1], rng.randint(*freq)])
+    return blocks, connections
+
+def other_block_port(con, ports, rng):
+    # Pick a random port on a different block than con.
+    while True:
+        other = rng.choice(ports)
+        if other.split(".")[0] != con.split(".")[0]:
+            return other
+
+def write_design(blocks_file, ports_file, blocks, connections):
+    # Write a generated design in the CSV format read by MCTS.parse_blocks and parse_ports.
+    with open(blocks_file, "w") as f:
+        f.write("block, coordinates\n")
+        for block_id, coords in blocks:
+            f.write(f"{block_id}, " + " ".join(f"{{{x} {y}}}" for x, y in coords) + "\n")
+    with open(ports_file, "w") as f:
+        f.write("srcPort, destPort, Width ,Frequency (Mhz)\n")
+        for con1, con2, length, freq in connections:
+            f.write(f"{con1}, {con2}, {length}, {freq}\n")
@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+import block_ip
+from mcts import MCTS
+from benchmarks.generate import generate_design, write_design
+
+def git_commit():
+    # Return the current commit hash, or None outside a git checkout.
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def peak_memory_mb():
+    # Peak resident set size of this process in MB, or None where the resource module is unavailable.
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+def measure(bench, args, *files):
+    # Run one benchmark and add the peak memory of the process running it.
+    results = bench(args, *files)
+    results["peak_memory_mb"] = peak_memory_mb()
+    return results
+
+def measure_into(queue, bench, args, *files):
+    # Run measure in a child process and send its results back through queue.
+    queue.put(measure(bench, args, *files))
+
+def run_isolated(bench, args, *files):
+    # Run one benchmark in a fresh process, so its peak memory is not inflated by the benchmarks before it.
+    # A plain Process rather than a Pool worker, since pool workers may not start the tempering replicas.
+    context = multiprocessing.get_context("spawn")
+    queue = context.SimpleQueue()
+    proc = context.Process(target=measure_into, args=(queue, bench, args) + files)
+    proc.start()
+    results = queue.get()
+    proc.join()
+    return results
+
+def new_mcts(args, blocks_file, ports_file, cache_file=None):
+    # Build a preprocessed MCTS with a fresh tree and reset global state for repeatable runs.
+    random.seed(args.seed)
+    block_ip.global_t = 1
+    obj = MCTS(backend=args.backend)
+    obj.load_design(blocks_file, ports_file, cache_file)
+    obj.set_root()
+    return obj
+
+def bench_parse(args, blocks_file, ports_file, cache_file):
+    # Time parsing plus preprocessing from CSV, writing the cache, and loading from the cache.
+    results = {}
+    for name in ["parse_seconds", "cache_write_seconds", "cache_load_seconds"]:
+        start = time.perf_counter()
+        obj = MCTS(backend=args.backend)
+        obj.load_design(blocks_file, ports_file, None if name == "parse_seconds" else cache_file)
+        results[name] = time.perf_counter() - start
+    results["ports"] = obj.connectivity.num_ports()
+    results["actions"] = len(obj.action_set)
+    return results
+
+def bench_moves(args, blocks_file, ports_file):
+    # Random move_port calls per second on the scratch placement.
+    obj = new_mcts(args, blocks_file, ports_file)
+    placement = obj.scratch
+    placement.get_total_cost()
+    actions = [random.choice(obj.port_actions) for i in range(args.moves)]
+    start = time.perf_counter()
+    for block_id, port_index, direct in actions:
+        placement.move_port(block_id, port_index, direct)
+    elapsed = time.perf_counter() - start
+    return {"moves": args.moves, "seconds": elapsed, "moves_per_second": args.moves / elapsed}
+
+def bench_annealing(args, blocks_file, ports_file):
+    # simulated_annealing iterations per second and the cost reached.
+    obj = new_mcts(args, blocks_file, ports_file)
+    start = time.perf_counter()
+    cost = obj.simulated_annealing(obj.scratch, iterations=args.anneal_iterations, temperature=args.anneal_iterations)
+    elapsed = time.perf_counter() - start
+    return {"iterations": args.anneal_iterations, "seconds": elapsed,
+            "iterations_per_second": args.anneal_iterations / elapsed, "final_cost": cost}
+
+def bench_mcts(args, blocks_file, ports_file):
+    # perform_MCTS iterations per second and the final cost.
+    obj = new_mcts(args, blocks_file, ports_file)
+    start = time.perf_counter()
+    obj.perform_MCTS(obj.root, iterations=args.mcts_iterations)
+    elapsed = time.perf_counter() - start
+    final = obj.traverse_final(obj.root)
+    return {"iterations": args.mcts_iterations, "seconds": elapsed,
+            "iterations_per_second": args.mcts_iterations / elapsed, "final_cost": final.get_total_cost()}
+
+def bench_collisions(args, blocks_file, ports_file):
+    # Random move_port calls per second with cross-block collisions on, and how many left a collision.
+    obj = MCTS(backend=args.backend)
+    random.seed(args.seed)
+    block_ip.global_t = 1
+    obj.load_design(blocks_file, ports_file)
+    obj.enable_collisions(penalty=1)
+    obj.set_root()
+    placement = obj.scratch
+    placement.get_total_cost()
+    actions = [random.choice(obj.port_actions) for i in range(args.moves)]
+    colliding = 0
+    start = time.perf_counter()
+    for block_id, port_index, direct in actions:
+        placement.move_port(block_id, port_index, direct)
+        colliding += placement.grid.total > 0
+    elapsed = time.perf_counter() - start
+    return {"moves": args.moves, "seconds": elapsed, "moves_per_second": args.moves / elapsed,
+            "moves_with_collisions": colliding}
+
+def bench_tempering(args, blocks_file, ports_file):
+    # ParallelTempering moves per second over all replicas and the cost reached; peak memory covers the
+    # parent only, each replica holds one more copy of the placement.
+    from tempering import ParallelTempering
+    obj = new_mcts(args, blocks_file, ports_file)
+    tempering = ParallelTempering(obj, args.replicas, seed=args.seed)
+    try:
+        start = time.perf_counter()
+        cost = tempering.anneal(obj.scratch, iterations=args.anneal_iterations)
+        elapsed = time.perf_counter() - start
+    finally:
+        tempering.close()
+    return {"replicas": args.replicas, "iterations": args.anneal_iterations, "seconds": elapsed,
+            "moves_per_second": tempering.moves / elapsed, "final_cost": cost}
+
+BENCHMARKS = {"moves": bench_moves, "annealing": bench_annealing, "mcts": bench_mcts, "collisions": bench_collisions,
+              "tempering": bench_tempering}
+
+def main(argv=None):
+    # Generate a seeded design, run the selected benchmarks and write the results as JSON.
+    parser = argparse.ArgumentParser(description="Port_Optimiser speed benchmarks on a synthetic design.")
+    parser.add_argument("--blocks", type=int, default=16, help="number of blocks")
+    parser.add_argument("--ports-per-block", type=int, default=8)
+    parser.add_argument("--nets", type=int, default=None, help="number of nets, default one per port")
+    parser.add_argument("--complexity", type=int, default=2, help="staircase steps per block outline")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", choices=["objects", "arrays"], default="objects")
+    parser.add_argument("--moves", type=int, default=100000)
+    parser.add_argument("--anneal-iterations", type=int, default=20000)
+    parser.add_argument("--mcts-iterations", type=int, default=5)
+    parser.add_argument("--replicas", type=int, default=4, help="tempering replicas")
+    parser.add_argument("--only", nargs="*", choices=["parse"] + list(BENCHMARKS), help="benchmarks to run, default all")
+    parser.add_argument("--output", default="bench_output.json", help="JSON results file")
+    args = parser.parse_args(argv)
+
+    blocks, connections = generate_design(args.blocks, args.ports_per_block, args.nets, args.complexity, args.seed)
+    selected = args.only or ["parse"] + list(BENCHMARKS)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        blocks_file = os.path.join(tmp, "blocks.csv")
+        ports_file = os.path.join(tmp, "connectivity.csv")
+        write_design(blocks_file, ports_file, blocks, connections)
+        if "parse" in selected:
+            results["parse"] = run_isolated(bench_parse, args, blocks_file, ports_file, os.path.join(tmp, "design.cache"))
+        for name, bench in BENCHMARKS.items():
+            if name in selected:
+                results[name] = run_isolated(bench, args, blocks_file, ports_file)
+                print(name, json.dumps(results[name]))
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+if __name__ == "__main__":
+    main()
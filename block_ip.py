@@ -1,7 +1,15 @@
 from copy import deepcopy
+from bisect import bisect_right
 from port import Port
+from edge_index import EdgeIntervals
+from transposition import zobrist_key
+import zlib
+
+global_t = 1  # Global step counter used for the step decay of port moves
 
 class BlockIP:
+    layout = None  # Shared ArrayLayout when the block is backed by flat arrays
+
     def __init__(self, block_id, edge_coords, alpha=1, step_decay=1):
         # Initialize the BlockIP instance.
         self.block_id = block_id
@@ -12,14 +20,20 @@ class BlockIP:
         self.step_decay = step_decay
         self.overlap_cost = 0
         self.map_port = {}
+        self.edge_index = []  # EdgeIntervals of the ports on every edge, built by process_edges
+        self.edge_geometry = []  # (corner x, corner y, ux, uy, nx, ny) of every edge, built by process_edges
+        self.perimeter = [0]  # Arc length of the perimeter at the start of every edge, and the total at the end
+        self.zobrist_seed = zlib.crc32(block_id.encode())
+        self.zobrist = 0  # XOR of the Zobrist keys of all ports, valid once process_edges has run
 
     def __deepcopy__(self, memo):
-        # Create a deep copy of the BlockIP instance.
+        # Copy the placement of the block, sharing ports, coordinates and edges.
         cls = self.__class__
         obj = cls.__new__(cls)
         memo[id(self)] = obj
-        for k, v in self.__dict__.items():
-            setattr(obj, k, deepcopy(v, memo))
+        obj.__dict__.update(self.__dict__)
+        obj.block_ports = [list(port_info) for port_info in self.block_ports]
+        obj.edge_index = deepcopy(self.edge_index, memo)
         return obj
 
     def get_block_coords(self):
@@ -34,20 +48,54 @@ class BlockIP:
         # Sort the ports based on their edge number.
         self.block_ports.sort(key=lambda x: x[1])
 
-    def process_edges(self):
-        # Process the edges of the block to determine lengths and directions.
+    def process_edges(self, build_index=True):
+        # Process the edges of the block to determine lengths and directions. Pass build_index=False when
+        # the edge index, overlap cost and Zobrist hash are restored separately, as design_cache does.
         for index in range(len(self.block_coords) - 1):
             x1, y1 = self.block_coords[index]
             x2, y2 = self.block_coords[index + 1]
             dir = 1 if (x1 != x2 and y1 < y2) or (y1 == y2 and x1 < x2) else -1
             length = abs(x1 - x2) + abs(y1 - y2)
             self.edges.append([length, dir])
+            # A port at pos with length l covers corner + pos*u to corner + (pos + l)*u + port_width*n.
+            if index % 2 == 0:
+                self.edge_geometry.append((x1, y1, 0, dir, dir, 0))
+            else:
+                self.edge_geometry.append((x1, y1, dir, 0, 0, -dir))
+            self.perimeter.append(self.perimeter[-1] + length)
+        if build_index:
+            self.build_edge_index()
+
+    def perimeter_location(self, offset):
+        # Convert an arc length along the perimeter to the edge and position on that edge.
+        edge = min(bisect_right(self.perimeter, offset) - 1, len(self.edges) - 1)
+        return edge, offset - self.perimeter[edge]
+
+    def perimeter_offset(self, edge, pos):
+        # Convert an edge and position to an arc length along the perimeter.
+        return self.perimeter[edge] + pos
+
+    def fit_location(self, edge, pos, port_len):
+        # Clamp a position so a port of the given length lies within its edge.
+        return edge, max(0, min(pos, self.edges[edge][0] - port_len))
+
+    def build_edge_index(self):
+        # Build the per-edge interval index and the total overlap of the current placement.
+        self.edge_index = [EdgeIntervals() for edge in self.edges]
+        self.overlap_cost = 0
+        self.zobrist = 0
+        for port_index, (port, edge, pos) in enumerate(self.block_ports):
+            self.overlap_cost += self.edge_index[edge].insert(pos, port.get_port_length())
+            self.zobrist ^= zobrist_key(self.zobrist_seed, port_index, edge, pos)
 
     def add_port(self, port):
         # Add a port to the block.
         self.map_port[port.get_port_id()] = len(self.block_ports)
         self.block_ports.append([port, 0, 0])  # Adding port at the 0-th edge initially
         port.set_port_block(self.block_id)
+        if self.edge_index:
+            self.overlap_cost += self.edge_index[0].insert(0, port.get_port_length())
+            self.zobrist ^= zobrist_key(self.zobrist_seed, len(self.block_ports) - 1, 0, 0)
 
     def line_overlaps(self, port1_info, port2_info):
         # Calculate if two ports on the same edge overlap.
@@ -92,49 +140,64 @@ class BlockIP:
                 overlap += self.line_overlaps(edge_ports[index1], edge_ports[index2])
         return overlap/2
 
-    def total_overlap(self):
-        # Calculate total overlap across all edges.
-        self.overlap_cost = sum(self.edge_overlap(index) for index in range(len(self.edges)))
+    def total_overlap(self, cross_check=False):
+        # Return total overlap across all edges, optionally checking the incremental value against a full recount.
+        if not self.edge_index:
+            self.overlap_cost = sum(self.edge_overlap(index) for index in range(len(self.edges)))
+        elif cross_check:
+            overlap = sum(self.edge_overlap(index) for index in range(len(self.edges)))
+            if abs(overlap - self.overlap_cost) > 1e-6:
+                raise RuntimeError(f"Block {self.block_id}: incremental overlap {self.overlap_cost} != recomputed overlap {overlap}")
         return self.overlap_cost
 
-    def move_port(self, port_id, direct):
-        # Move a port to a different position on the edge.
+    def next_position(self, edge, pos, port_len, direct):
+        # Compute the edge and position a port moves to when stepped in the given direction.
         global global_t
-        port, edge, pos = self.block_ports[port_id]
-        port_len = port.get_port_length()
         pos += direct*(max(1,int(self.alpha - self.step_decay**global_t)))
         
         edge_len, edge_dir = self.edges[edge]
         new_edge = edge
         new_pos = pos
 
-        moved_to_other_edge=False
         if pos<0:
             # move to previous edge
-            moved_to_other_edge=True
             new_edge = edge-1
             if new_edge<0:
                 new_edge = len(self.edges)-1
             new_pos = self.edges[new_edge][0] - port_len
         elif pos+port_len>edge_len:
             # move to next edge
-            moved_to_other_edge=True
             new_edge=edge+1
             if new_edge>=len(self.edges):
                 new_edge = 0
             new_pos = 0
-        
-        cost = -self.edge_overlap(edge) 
-        if moved_to_other_edge==True:
-            cost -= self.edge_overlap(new_edge)
+        return new_edge, new_pos
+
+    def move_port(self, port_id, direct):
+        # Move a port to a different position on the edge.
+        port, edge, pos = self.block_ports[port_id]
+        new_edge, new_pos = self.next_position(edge, pos, port.get_port_length(), direct)
+        self.place_port(port_id, new_edge, new_pos)
+
+    def place_port(self, port_id, new_edge, new_pos):
+        # Put a port at the given edge and position, keeping the overlap index up to date.
+        port, edge, pos = self.block_ports[port_id]
+        port_len = port.get_port_length()
+        cost = -self.edge_index[edge].remove(pos, port_len)
+        cost += self.edge_index[new_edge].insert(new_pos, port_len)
         
         self.block_ports[port_id] = [port, new_edge, new_pos]
-        
-        cost += self.edge_overlap(edge)
-        if moved_to_other_edge==True:
-            cost += self.edge_overlap(new_edge)
-        
         self.overlap_cost += cost
+        self.zobrist ^= zobrist_key(self.zobrist_seed, port_id, edge, pos) ^ zobrist_key(self.zobrist_seed, port_id, new_edge, new_pos)
+
+    def get_port_location(self, port_index):
+        # Get the edge and position of a port from its index in block_ports.
+        port, edge, pos = self.block_ports[port_index]
+        return edge, pos
+
+    def get_port_by_index(self, port_index):
+        # Get the Port object from its index in block_ports.
+        return self.block_ports[port_index][0]
 
     def get_port_index(self, port_name):
         # Get the index of a port in the block.
@@ -142,33 +205,37 @@ class BlockIP:
 
     def get_port_pos(self, port_name):
         # Get the position of a port in the block.
-        port_index = self.map_port[port_name]
+        return self.get_port_pos_by_index(self.map_port[port_name])
+
+    def get_port_pos_by_index(self, port_index):
+        # Get the position of a port in the block from its index in block_ports.
         port, edge, pos = self.block_ports[port_index]
-        
-        corner_x, corner_y  = self.block_coords[edge]
-        _, direct = self.edges[edge]
-        
-        posx_l = corner_x
-        posy_l = corner_y
-        posx_r = corner_x
-        posy_r = corner_y
-        port_len = port.get_port_length()
-        if direct == 1 and edge%2==0:
-            posy_l += pos
-            posx_r += Port.port_width
-            posy_r += pos + port_len
-        elif direct == 1 and edge%2==1:
-            posx_l += pos
-            posx_r += pos + port_len
-            posy_r -= Port.port_width
-        elif direct == -1 and edge%2==0:
-            posy_l -= pos
-            posx_r -= Port.port_width
-            posy_r -= pos + port_len
-        else:
-            posx_l -= pos
-            posx_r -= pos + port_len
-            posy_r += Port.port_width
-            
-        return [posx_l, posy_l, posx_r, posy_r]
+        corner_x, corner_y, ux, uy, nx, ny = self.edge_geometry[edge]
+        end = pos + port.get_port_length()
+        return [corner_x + pos * ux, corner_y + pos * uy,
+                corner_x + end * ux + Port.port_width * nx, corner_y + end * uy + Port.port_width * ny]
+
+    def get_port_center(self, port_name):
+        # Get the center of a port in the block.
+        return self.get_port_center_by_index(self.map_port[port_name])
 
+    def get_port_center_by_index(self, port_index):
+        # Get the center of a port in the block from its index in block_ports.
+        port, edge, pos = self.block_ports[port_index]
+        corner_x, corner_y, ux, uy, nx, ny = self.edge_geometry[edge]
+        along = pos + port.get_port_length() / 2.0
+        half_width = Port.port_width / 2.0
+        return corner_x + along * ux + half_width * nx, corner_y + along * uy + half_width * ny
+
+    def get_port_centers(self, port_indices):
+        # Get the centers of many ports of the block at once.
+        block_ports = self.block_ports
+        edge_geometry = self.edge_geometry
+        half_width = Port.port_width / 2.0
+        centers = []
+        for port_index in port_indices:
+            port, edge, pos = block_ports[port_index]
+            corner_x, corner_y, ux, uy, nx, ny = edge_geometry[edge]
+            along = pos + port.get_port_length() / 2.0
+            centers.append((corner_x + along * ux + half_width * nx, corner_y + along * uy + half_width * ny))
+        return centers
@@ -0,0 +1,101 @@
+import os
+import time
+import pickle
+import random
+import block_ip
+
+CHECKPOINT_VERSION = 2
+
+def dump_tree(node, depth, max_children=None):
+    # Nested [delta, action, visits, cost, key, next action, children] of a node and its descendants down to
+    # depth levels, keeping at most max_children most visited children per node. Nodes whose children are not
+    # saved get next action 0, so they are expanded again; the unsaved children of a capped node are dropped
+    # like the subtrees MCTS.prune_tree removes.
+    children = []
+    if depth > 0:
+        children = node.children
+        if max_children is not None and len(children) > max_children:
+            children = sorted(sorted(children, key=lambda child: child.visits, reverse=True)[:max_children],
+                              key=lambda child: child.index)
+        children = [dump_tree(child, depth - 1, max_children) for child in children]
+    return [node.delta, node.action, node.visits, node.cost, node.key, node.next_action if depth > 0 else 0, children]
+
+def load_tree(node, data):
+    # Rebuild the children saved by dump_tree under a node.
+    delta, action, node.visits, node.cost, node.key, node.next_action, children = data
+    for child_data in children:
+        load_tree(node.new_child(child_data[0], child_data[1]), child_data)
+
+class Checkpointer:
+    # Periodically writes the best placement, RNG state, counters, costs and the top tree_depth levels of
+    # the search tree, at most max_children most visited children per node, to one file. The cap keeps every
+    # save the same size however wide the tree grows. The pickled best placement is reused until the best cost
+    # changes, and files are written to a temporary name and renamed, so a killed job never leaves a torn checkpoint.
+
+    def __init__(self, file_path, interval=5.0, tree_depth=2, max_children=32):
+        # Initialize the checkpointer with the file, the minimum seconds between writes, the tree depth and the
+        # children per node to keep.
+        self.file_path = file_path
+        self.interval = interval
+        self.tree_depth = tree_depth
+        self.max_children = max_children
+        self.last_save = time.perf_counter()
+        self.outputs = []  # Costs of the iterations before the current perform_MCTS call
+        self.best_cost = None
+        self.best_bytes = None
+
+    def maybe_save(self, obj, outputs):
+        # Save if interval seconds passed since the last save.
+        if time.perf_counter() - self.last_save >= self.interval:
+            self.save(obj, outputs)
+
+    def save(self, obj, outputs):
+        # Write a checkpoint of an MCTS run whose current perform_MCTS call produced outputs.
+        if self.best_bytes is None or obj.best_cost != self.best_cost:
+            self.best_cost = obj.best_cost
+            self.best_bytes = pickle.dumps(obj.best_locations, pickle.HIGHEST_PROTOCOL)
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "iterations": obj.iterations_done,
+            "global_t": block_ip.global_t,
+            "evaluations": obj.evaluations,
+            "rng": random.getstate(),
+            "root_locations": obj.root_locations,
+            "best_cost": obj.best_cost,
+            "best_locations": self.best_bytes,
+            "outputs": self.outputs + outputs,
+            "tree": dump_tree(obj.root, self.tree_depth, self.max_children) if self.tree_depth > 0 else None,
+        }
+        tmp_path = self.file_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.file_path)
+        self.last_save = time.perf_counter()
+
+def resume(obj, file_path, checkpointer=None):
+    # Restore a run saved by Checkpointer into an MCTS whose design is loaded, replacing its tree. Returns the
+    # costs of the iterations done so far, or None if there is no checkpoint. The checkpointer, if given,
+    # carries those costs on into later saves.
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "rb") as f:
+        data = pickle.load(f)
+    if data.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{file_path}: unsupported checkpoint version {data.get('version')}")
+    for block, block_locations in zip(obj.block_list, data["root_locations"]):
+        for port_index, (edge, pos) in enumerate(block_locations):
+            block.place_port(port_index, edge, pos)
+    obj.set_root()
+    if data["tree"] is not None:
+        load_tree(obj.root, data["tree"])
+    obj.iterations_done = data["iterations"]
+    block_ip.global_t = data["global_t"]
+    obj.evaluations = data["evaluations"]
+    obj.best_cost = data["best_cost"]
+    obj.best_locations = pickle.loads(data["best_locations"])
+    random.setstate(data["rng"])
+    if checkpointer is not None:
+        checkpointer.outputs = data["outputs"]
+        checkpointer.best_cost = obj.best_cost
+        checkpointer.best_bytes = data["best_locations"]
+    return data["outputs"]
@@ -0,0 +1,108 @@
+class ConnectivityIndex:
+    def __init__(self, block_list, map_blocks, map_connectivity):
+        # Compile the string keyed connectivity map into integer port ids and CSR neighbor arrays.
+        self.port_block = []  # Block index of every port id
+        self.port_index = []  # Index of every port id inside its block's block_ports
+        self.port_ids = []  # Port id of every (block index, port index) pair
+        self.port_keys = []  # "block.port" of every port id
+        map_port_id = {}
+        for block in block_list:
+            block_index = map_blocks[block.get_block_id()]
+            block_port_ids = []
+            for port_index, (port, edge, pos) in enumerate(block.block_ports):
+                port_id = len(self.port_block)
+                key = block.get_block_id() + '.' + port.get_port_id()
+                map_port_id[key] = port_id
+                self.port_keys.append(key)
+                self.port_block.append(block_index)
+                self.port_index.append(port_index)
+                block_port_ids.append(port_id)
+            self.port_ids.append(block_port_ids)
+
+        self.offsets = [0]  # Neighbors of port id i are neighbors[offsets[i]:offsets[i + 1]]
+        self.neighbors = []
+        self.freqs = []  # Frequency of every net, aligned with neighbors
+        for key in self.port_keys:
+            for con, freq in map_connectivity.get(key, []):
+                self.neighbors.append(map_port_id[con])
+                self.freqs.append(freq)
+            self.offsets.append(len(self.neighbors))
+
+    @classmethod
+    def from_arrays(cls, block_ids, port_names, block_offsets, offsets, neighbors, freqs):
+        # Rebuild an index from the arrays saved by design_cache; port ids are numbered block by block as in
+        # __init__, so block_offsets[b]:block_offsets[b + 1] are the ports of block b. The nets stay in the
+        # mapped arrays, read through memory views, so processes loading the same cache share their pages.
+        obj = cls.__new__(cls)
+        block_offsets = block_offsets.tolist()
+        obj.port_block = []
+        obj.port_index = []
+        obj.port_ids = []
+        for block_index in range(len(block_ids)):
+            start, end = block_offsets[block_index], block_offsets[block_index + 1]
+            obj.port_block.extend([block_index] * (end - start))
+            obj.port_index.extend(range(end - start))
+            obj.port_ids.append(list(range(start, end)))
+        obj.port_keys = [block_ids[block_index] + '.' + port_name for block_index, port_name in zip(obj.port_block, port_names)]
+        obj.offsets = memoryview(offsets)
+        obj.neighbors = memoryview(neighbors)
+        obj.freqs = memoryview(freqs)
+        return obj
+
+    def __getstate__(self):
+        # Memory views do not pickle, so send the nets of a mapped index to other processes as lists.
+        state = dict(self.__dict__)
+        for name in ("offsets", "neighbors", "freqs"):
+            if isinstance(state[name], memoryview):
+                state[name] = state[name].tolist()
+        return state
+
+    def connection_map(self):
+        # Rebuild the "block.port" -> [["block.port", frequency], ...] map the index was compiled from.
+        keys = self.port_keys
+        offsets = self.offsets
+        return {key: [[keys[neighbor], freq] for neighbor, freq in
+                      zip(self.neighbors[offsets[port_id]:offsets[port_id + 1]], self.freqs[offsets[port_id]:offsets[port_id + 1]])]
+                for port_id, key in enumerate(keys) if offsets[port_id] != offsets[port_id + 1]}
+
+    def num_ports(self):
+        # Return the number of ports in the index.
+        return len(self.port_block)
+
+    def get_port_id(self, block_index, port_index):
+        # Return the port id of a port given its block index and its index in the block.
+        return self.port_ids[block_index][port_index]
+
+    def port_cost(self, blocks, port_id):
+        # Sum of the distances from a port to all of its connected ports.
+        port_block = self.port_block
+        port_index = self.port_index
+        x1, y1 = blocks[port_block[port_id]].get_port_center_by_index(port_index[port_id])
+        cost = 0.0
+        for neighbor in self.neighbors[self.offsets[port_id]:self.offsets[port_id + 1]]:
+            x2, y2 = blocks[port_block[neighbor]].get_port_center_by_index(port_index[neighbor])
+            dx = x2 - x1
+            dy = y2 - y1
+            cost += (dx * dx + dy * dy) ** 0.5
+        return cost
+
+    def port_centers(self, blocks):
+        # Centers of all ports indexed by port id, with one get_port_centers call per block.
+        centers = []
+        for block, block_port_ids in zip(blocks, self.port_ids):
+            centers.extend(block.get_port_centers(range(len(block_port_ids))))
+        return centers
+
+    def total_dist(self, blocks, is_HPWL=False):
+        # Total Euclidean distance or HPWL over all nets; every net is stored from both ends, so this is half the sum.
+        centers = self.port_centers(blocks)
+        offsets = self.offsets
+        total = 0.0
+        for port_id, (x1, y1) in enumerate(centers):
+            for neighbor in self.neighbors[offsets[port_id]:offsets[port_id + 1]]:
+                x2, y2 = centers[neighbor]
+                if is_HPWL:
+                    total += abs(x2 - x1) + abs(y2 - y1)
+                else:
+                    total += ((x2 - x1) ** 2 + (y2 - y1) ** 2) ** 0.5
+        return total / 2.0
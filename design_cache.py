@@ -0,0 +1,185 @@
+import os
+import json
+import zlib
+import numpy as np
+from block_ip import BlockIP
+from port import Port
+from edge_index import EdgeIntervals
+from connectivity import ConnectivityIndex
+
+CACHE_MAGIC = b"PODESIGN"
+CACHE_VERSION = 4
+CACHE_ALIGN = 64
+
+def source_stamps(sources):
+    # Size and modification time of every source file, used to detect a stale cache.
+    stamps = []
+    for path in sources:
+        stat = os.stat(path)
+        stamps.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    return stamps
+
+def edge_points(block_list):
+    # Return the sorted start and end points of the ports on every edge, as the EdgeIntervals lists,
+    # concatenated edge by edge, and the offsets of every edge's points in them. Works on both backends.
+    edge_base = [0]
+    edges, starts, lengths = [], [], []
+    for block in block_list:
+        for port_index in range(len(block.block_ports)):
+            edge, pos = block.get_port_location(port_index)
+            edges.append(edge_base[-1] + edge)
+            starts.append(pos)
+            lengths.append(block.get_port_by_index(port_index).get_port_length())
+        edge_base.append(edge_base[-1] + len(block.edges))
+    edges = np.array(edges, dtype=np.int64)
+    starts = np.array(starts, dtype=np.int64)
+    ends = starts + np.array(lengths, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(edges, minlength=edge_base[-1]))))
+    return offsets, starts[np.lexsort((starts, edges))], ends[np.lexsort((ends, edges))]
+
+def blocks_cache_path(cache_path, blocks_file):
+    # File holding the block data of a design cache, next to it and keyed by the blocks file alone, so
+    # designs that share a blocks file share one copy.
+    key = zlib.crc32(os.path.abspath(blocks_file).encode())
+    return os.path.join(os.path.dirname(os.path.abspath(cache_path)), f"{os.path.basename(blocks_file)}.{key:08x}.poblocks")
+
+def save_design(obj, cache_path, sources):
+    # Save a preprocessed design as a JSON header followed by aligned raw arrays that load_design memory maps.
+    # Besides the parsed input, the cache holds the edge-overlap state: the sorted points of every edge index
+    # and the overlap cost and Zobrist hash of every block, so loading skips rebuilding them. The block
+    # outlines go to blocks_cache_path, which is only rewritten when the blocks file changed.
+    connectivity = obj.connectivity
+    blocks_path = blocks_cache_path(cache_path, sources[0])
+    if read_cache(blocks_path, sources[:1]) is None:
+        coords = [coord for block in obj.block_list for coord in block.get_block_coords()]
+        write_cache(blocks_path, {
+            "version": CACHE_VERSION,
+            "sources": source_stamps(sources[:1]),
+            "block_ids": [block.get_block_id() for block in obj.block_list],
+        }, {
+            "coord_offsets": np.cumsum([0] + [len(block.get_block_coords()) for block in obj.block_list]),
+            "coords": np.array(coords, dtype=np.int64).reshape(-1, 2),
+        })
+    edge_offsets, edge_starts, edge_ends = edge_points(obj.block_list)
+    arrays = {
+        "block_offsets": np.cumsum([0] + [len(ids) for ids in connectivity.port_ids]),
+        "port_length": np.array([block.get_port_by_index(port_index).get_port_length()
+                                 for block in obj.block_list for port_index in range(len(block.block_ports))], dtype=np.int64),
+        "port_location": np.array([block.get_port_location(port_index)
+                                   for block in obj.block_list for port_index in range(len(block.block_ports))], dtype=np.int64).reshape(-1, 2),
+        "offsets": np.array(connectivity.offsets, dtype=np.int64),
+        "neighbors": np.array(connectivity.neighbors, dtype=np.int64),
+        "freqs": np.array(connectivity.freqs, dtype=np.int64),
+        "actions": np.array(obj.port_actions, dtype=np.int64).reshape(-1, 3),
+        "block_overlap": np.array([block.overlap_cost for block in obj.block_list], dtype=np.int64),
+        "block_zobrist": np.array([block.zobrist for block in obj.block_list], dtype=np.uint64).view(np.int64),
+        "edge_offsets": edge_offsets,
+        "edge_starts": edge_starts,
+        "edge_ends": edge_ends,
+    }
+    write_cache(cache_path, {
+        "version": CACHE_VERSION,
+        "sources": source_stamps(sources),
+        "blocks": os.path.basename(blocks_path),
+        "port_ids": [block.get_port_by_index(port_index).get_port_id()
+                     for block in obj.block_list for port_index in range(len(block.block_ports))],
+    }, arrays)
+
+def write_cache(cache_path, header, arrays):
+    # Write a header and int64 arrays in the layout read_cache maps, replacing cache_path atomically.
+    header["arrays"] = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = arrays[name] = np.ascontiguousarray(array, dtype=np.int64)
+        header["arrays"][name] = [list(array.shape), offset]
+        offset += -(-array.nbytes // CACHE_ALIGN) * CACHE_ALIGN
+    header_bytes = json.dumps(header).encode()
+    data_start = -(-(len(CACHE_MAGIC) + 8 + len(header_bytes)) // CACHE_ALIGN) * CACHE_ALIGN
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(CACHE_MAGIC)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header["arrays"][name][1])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, cache_path)
+
+def read_cache(cache_path, sources):
+    # Return the header and the memory-mapped arrays of a cache file, or None if it is missing or stale.
+    try:
+        with open(cache_path, "rb") as f:
+            if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+            header_len = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_len))
+    except (OSError, ValueError):
+        return None
+    if header.get("version") != CACHE_VERSION or header["sources"] != source_stamps(sources):
+        return None
+    data_start = -(-(len(CACHE_MAGIC) + 8 + header_len) // CACHE_ALIGN) * CACHE_ALIGN
+    buffer = np.memmap(cache_path, dtype=np.uint8, mode="r")
+    arrays = {}
+    for name, (shape, offset) in header["arrays"].items():
+        count = int(np.prod(shape))
+        start = data_start + offset
+        arrays[name] = buffer[start:start + 8 * count].view(np.int64).reshape(shape)
+    return header, arrays
+
+def load_design(obj, cache_path, sources):
+    # Restore a preprocessed design saved by save_design into an MCTS. Returns False if the cache is
+    # missing or older than the source files. The connectivity index and the array backend are built on the
+    # mapped arrays, the edge indexes come from the saved points, and map_connectivity and action_set are left
+    # to be rebuilt on first use.
+    cache = read_cache(cache_path, sources)
+    if cache is None:
+        return False
+    header, arrays = cache
+    blocks = read_cache(os.path.join(os.path.dirname(os.path.abspath(cache_path)), header["blocks"]), sources[:1])
+    if blocks is None:
+        return False
+    block_ids = blocks[0]["block_ids"]
+    arrays.update(blocks[1])
+    port_ids = header["port_ids"]
+    coord_offsets = arrays["coord_offsets"].tolist()
+    coords = arrays["coords"].tolist()
+    block_offsets = arrays["block_offsets"].tolist()
+    port_length = arrays["port_length"].tolist()
+    port_location = arrays["port_location"].tolist()
+    overlaps = arrays["block_overlap"].tolist()
+    zobrists = arrays["block_zobrist"].view(np.uint64).tolist()
+    edge_offsets = arrays["edge_offsets"].tolist()
+    edge_starts = arrays["edge_starts"].tolist()
+    edge_ends = arrays["edge_ends"].tolist()
+
+    obj.block_list = []
+    obj.map_blocks = {}
+    edge_id = 0
+    for block_index, block_id in enumerate(block_ids):
+        block = BlockIP(block_id, coords[coord_offsets[block_index]:coord_offsets[block_index + 1]], alpha=obj.alpha, step_decay=obj.step_decay)
+        start, end = block_offsets[block_index], block_offsets[block_index + 1]
+        block.block_ports = [[Port(port_id, length, block_id), edge, pos] for port_id, length, (edge, pos) in
+                             zip(port_ids[start:end], port_length[start:end], port_location[start:end])]
+        block.map_port = {port_id: port_index for port_index, port_id in enumerate(port_ids[start:end])}
+        block.process_edges(build_index=False)
+        block.overlap_cost = overlaps[block_index]
+        block.zobrist = zobrists[block_index]
+        for start, end in zip(edge_offsets[edge_id:edge_id + len(block.edges)], edge_offsets[edge_id + 1:edge_id + len(block.edges) + 1]):
+            block.edge_index.append(EdgeIntervals(edge_starts[start:end], edge_ends[start:end]))
+        edge_id += len(block.edges)
+        obj.block_list.append(block)
+        obj.map_blocks[block_id] = block_index
+
+    obj.connectivity = ConnectivityIndex.from_arrays(block_ids, port_ids, arrays["block_offsets"], arrays["offsets"],
+                                                     arrays["neighbors"], arrays["freqs"])
+    obj.map_connectivity = None
+    obj.port_actions = arrays["actions"].tolist()
+    obj.action_set = None
+    obj.run_blocks_once = False
+    obj.run_connectivity_once = False
+    if obj.backend == "arrays":
+        from array_layout import ArrayLayout
+        obj.block_list = ArrayLayout.from_arrays(obj.block_list, arrays["port_length"], arrays["port_location"], arrays["block_offsets"],
+                                                 arrays["offsets"], arrays["neighbors"]).blocks
+    return True
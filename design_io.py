@@ -0,0 +1,59 @@
+class DesignFormatError(ValueError):
+    # Malformed row in a block or connectivity file.
+
+    def __init__(self, file_path, line_no, message):
+        # Record where the error is so it can be reported as path:line.
+        super().__init__(f"{file_path}:{line_no}: {message}")
+        self.file_path = file_path
+        self.line_no = line_no
+
+def read_blocks(file_path):
+    # Yield (block id, [[x, y], ...]) for every row of a block file, skipping blank lines and the header, which
+    # is recognised as a first non-blank line whose first column is named block.
+    with open(file_path) as f:
+        seen_row = False
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            block_id, sep, coords = line.partition(",")
+            block_id = block_id.strip()
+            if not seen_row:
+                seen_row = True
+                if block_id.lower() == "block":
+                    continue  # Header
+            if "{" not in coords:
+                raise DesignFormatError(file_path, line_no, "expected 'block, {x y} {x y} ...'")
+            values = coords.replace("{", " ").replace("}", " ").split()
+            if not block_id or len(values) != 2 * coords.count("{") or coords.count("{") != coords.count("}"):
+                raise DesignFormatError(file_path, line_no, f"malformed coordinates {coords.strip()!r}")
+            try:
+                values = [int(value) for value in values]
+            except ValueError:
+                raise DesignFormatError(file_path, line_no, f"non-integer coordinate in {coords.strip()!r}") from None
+            yield block_id, [values[i:i + 2] for i in range(0, len(values), 2)]
+
+def read_connections(file_path):
+    # Yield (line number, block.port, block.port, length, frequency) for every row of a connectivity file, skipping
+    # blank lines and the header, which is recognised as a first non-blank line whose first column is named srcPort.
+    with open(file_path) as f:
+        seen_row = False
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            row = [field.strip() for field in line.split(",")]
+            if not seen_row:
+                seen_row = True
+                if row[0].lower() == "srcport":
+                    continue  # Header
+            if len(row) != 4:
+                raise DesignFormatError(file_path, line_no, f"expected 4 fields, got {len(row)}")
+            con1, con2, length, freq = row
+            try:
+                length, freq = int(length), int(freq)
+            except ValueError:
+                raise DesignFormatError(file_path, line_no, f"non-integer width or frequency in {line!r}") from None
+            if con1.count(".") != 1 or con2.count(".") != 1:
+                raise DesignFormatError(file_path, line_no, "ports must be written as block.port")
+            yield line_no, con1, con2, length, freq
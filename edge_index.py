@@ -0,0 +1,45 @@
+from bisect import bisect_left, bisect_right, insort
+
+class EdgeIntervals:
+    # Port intervals on one block edge, kept as sorted lists of their start and end points, so the index
+    # grows with the number of ports on the edge and not with its length. With c(x) the number of intervals
+    # covering x, the overlap of [a, b) with the stored intervals is the integral of c over [a, b):
+    # c(a) * (b - a), plus (b - s) for every start s inside (a, b), minus (b - e) for every end e inside (a, b).
+
+    def __init__(self, starts=None, ends=None):
+        # Initialize an index, empty or from already sorted lists of start and end points.
+        self.starts = starts if starts is not None else []
+        self.ends = ends if ends is not None else []
+
+    def __deepcopy__(self, memo):
+        # Copy the two point lists; they only hold ints.
+        obj = self.__class__(self.starts[:], self.ends[:])
+        memo[id(self)] = obj
+        return obj
+
+    def overlap(self, pos, length):
+        # Total overlap of the interval [pos, pos + length) with the stored intervals, from four bisections
+        # and sums over the end points that fall inside the interval.
+        end = pos + length
+        starts = self.starts
+        ends = self.ends
+        start_lo = bisect_right(starts, pos)
+        start_hi = bisect_left(starts, end, start_lo)
+        end_lo = bisect_right(ends, pos)
+        end_hi = bisect_left(ends, end, end_lo)
+        return ((start_lo - end_lo) * length
+                + (start_hi - start_lo) * end - sum(starts[start_lo:start_hi])
+                - (end_hi - end_lo) * end + sum(ends[end_lo:end_hi]))
+
+    def insert(self, pos, length):
+        # Store an interval and return its overlap with the intervals already stored.
+        overlap = self.overlap(pos, length)
+        insort(self.starts, pos)
+        insort(self.ends, pos + length)
+        return overlap
+
+    def remove(self, pos, length):
+        # Remove an interval and return its overlap with the intervals that remain.
+        del self.starts[bisect_left(self.starts, pos)]
+        del self.ends[bisect_left(self.ends, pos + length)]
+        return self.overlap(pos, length)
@@ -1,30 +1,190 @@
-from mcts import MCTS
 import time
-import matplotlib.pyplot as plt
-from copy import deepcopy
 
-def main(blocks_file, ports_file, output_file):
-    #Main function to initialize and run the MCTS algorithm.
-    obj = MCTS()
-    obj.parse_blocks(blocks_file)
-    obj.parse_ports(ports_file)
-    obj.preprocess_blocks()
-    obj.set_root()
+START = time.perf_counter()  # Reference point for the startup time report
+
+import sys
+import argparse
+
+def main(blocks_file, ports_file, output_file, *, iterations=None, time_budget=None, seed=None, workers=1,
+         plot=None, backend="objects", cache_file=None, anytime=False, evaluation_budget=None, window=None,
+         warm_start=False, rollout="anneal", polish=False, collisions=False, checkpoint_file=None,
+         checkpoint_interval=5.0, partition=None, moves=None, max_tree_size=None, progress=False, telemetry_log=None,
+         telemetry_interval=1.0, overlap_penalty=0, tempering=None):
+    #Main function to initialize and run the MCTS algorithm. iterations defaults to 1000, or to no limit in
+    #anytime mode so the budgets decide when to stop. tempering is the number of parallel-tempering replicas
+    #that replace simulated annealing in the rollouts, None for plain annealing.
+    import random
+    from mcts import MCTS
+    if seed is not None:
+        random.seed(seed)
+    if iterations is None and not anytime:
+        iterations = 1000
+    obj = MCTS(backend=backend)
+    if progress or telemetry_log:
+        obj.telemetry = make_telemetry(progress, telemetry_log, telemetry_interval)
+    obj.load_design(blocks_file, ports_file, cache_file)
+    if warm_start:
+        obj.warm_start()
+    obj.rollout_policy = rollout
+    obj.max_tree_size = max_tree_size
+    if moves:
+        from moves import MoveMix
+        obj.move_mix = MoveMix(*moves)
+    obj.penalty = overlap_penalty
+    if collisions:
+        obj.enable_collisions()
+
+    if tempering:
+        from tempering import ParallelTempering
+        obj.tempering = ParallelTempering(obj, tempering, seed=seed or 0)
 
     t1 = time.time()
-    outputs = obj.perform_MCTS(obj.root)
+    try:
+        if partition:
+            obj.set_root()
+            print(f"Startup time is {time.perf_counter() - START} seconds")
+            final, parts = obj.perform_partitioned(partition, workers if workers > 1 else None, iterations, seed=seed or 0)
+            print("cluster sizes", [len(blocks) for blocks in parts])
+            outputs = [final.get_total_cost()]
+        elif workers > 1:
+            print(f"Startup time is {time.perf_counter() - START} seconds")
+            final, worker_outputs = obj.perform_parallel_MCTS(workers, iterations, seed=seed or 0, time_budget=time_budget)
+            outputs = min(worker_outputs, key=lambda costs: min(costs, default=float("inf")))
+        elif anytime:
+            obj.set_root()
+            print(f"Startup time is {time.perf_counter() - START} seconds")
+            final, outputs = obj.perform_anytime(obj.root, time_budget, evaluation_budget, window, window and 1000,
+                                                 max_iterations=iterations)
+        elif checkpoint_file is not None:
+            from checkpoint import Checkpointer
+            checkpoint = Checkpointer(checkpoint_file, checkpoint_interval)
+            previous = obj.resume_checkpoint(checkpoint_file, checkpoint) or []
+            print(f"Startup time is {time.perf_counter() - START} seconds")
+            if previous:
+                print(f"Resuming after {obj.iterations_done} iterations")
+            outputs = previous + obj.perform_MCTS(obj.root, max(0, iterations - obj.iterations_done), time_budget, checkpoint)
+            final = obj.traverse_final(obj.root)
+        else:
+            obj.set_root()
+            print(f"Startup time is {time.perf_counter() - START} seconds")
+            outputs = obj.perform_MCTS(obj.root, iterations, time_budget)
+            final = obj.traverse_final(obj.root)
+    finally:
+        if obj.tempering is not None:
+            obj.tempering.close()
+    if polish:
+        obj.refine(final)
     t2 = time.time()
     delta = t2 - t1
 
-    final = obj.traverse_final(obj.root)
+    obj.telemetry.close()
+
     final.export_port_positions(output_file)
     print("final cost", final.get_total_cost())
     print(f"Time difference is {delta} seconds")
-    plt.plot(outputs)
+    if plot:
+        # matplotlib is only needed here, so headless runs never import it.
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        plt.plot(outputs)
+        plt.savefig(plot)
+    return final
+
+def print_progress(event):
+    # Print one line per telemetry progress event to stderr.
+    best = event.get("best_cost")
+    sys.stderr.write(f"[{event['elapsed']:8.1f}s] iteration {event.get('iteration')} cost {event.get('cost', 0.0):.2f} "
+                     f"best {best if best is None else round(best, 2)} tree {event.get('tree_size')}\n")
+
+def make_telemetry(progress=False, telemetry_log=None, interval=1.0):
+    # Telemetry printing progress lines and a summary to stderr and/or appending every event to a JSON lines file.
+    from telemetry import Telemetry, CallbackSink, JsonLinesSink, SummarySink
+    sinks = []
+    if progress:
+        sinks += [CallbackSink(print_progress), SummarySink()]
+    if telemetry_log:
+        sinks.append(JsonLinesSink(telemetry_log))
+    return Telemetry(sinks, interval)
+
+def parse_args(argv=None):
+    # Parse the command line.
+    parser = argparse.ArgumentParser(description="Optimize port placement on preplaced blocks with MCTS.")
+    parser.add_argument("blocks_file", help="block outline CSV")
+    parser.add_argument("ports_file", help="connectivity CSV")
+    parser.add_argument("output_file", help="where to write the port positions")
+    parser.add_argument("--iterations", type=int, default=None,
+                        help="MCTS iterations (default 1000, unlimited with --anytime)")
+    parser.add_argument("--time-budget", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--anytime", action="store_true",
+                        help="return the best placement seen; stops on the budgets, convergence or Ctrl-C, "
+                             "and needs --time-budget, --eval-budget, --window or --iterations")
+    parser.add_argument("--eval-budget", type=int, default=None, help="anytime: maximum annealing moves")
+    parser.add_argument("--window", type=int, default=None,
+                        help="anytime: stop when the best cost improved by under 0.1%% over this many iterations")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="start from a connectivity-driven placement instead of every port at edge 0")
+    parser.add_argument("--rollout", choices=["anneal", "descent"], default="anneal",
+                        help="rollout policy: simulated annealing or batched steepest descent")
+    parser.add_argument("--polish", action="store_true", help="finish with batched steepest descent")
+    parser.add_argument("--tempering", type=int, default=None, metavar="N",
+                        help="anneal rollouts with N parallel-tempering replicas in worker processes")
+    parser.add_argument("--overlap-penalty", type=float, default=0, metavar="W",
+                        help="weight of overlapping ports in the cost (default 0, wire length only)")
+    parser.add_argument("--collisions", action="store_true",
+                        help="also count ports of different blocks that collide as overlap; needs --overlap-penalty")
+    parser.add_argument("--checkpoint", default=None,
+                        help="save progress to this file and resume from it if it exists")
+    parser.add_argument("--checkpoint-interval", type=float, default=5.0, help="seconds between checkpoints")
+    parser.add_argument("--moves", type=float, nargs=3, default=None, metavar=("SWAP", "JUMP", "SHIFT"),
+                        help="probabilities of port swaps, direct jumps and group shifts in annealing and rollouts")
+    parser.add_argument("--max-tree-size", type=int, default=None,
+                        help="prune the least visited subtrees when the tree's nodes plus stored port moves exceed this")
+    parser.add_argument("--partition", type=int, default=None, metavar="N",
+                        help="split the blocks into N clusters optimized in parallel, then refine across them")
+    parser.add_argument("--progress", action="store_true",
+                        help="print progress lines and a counter and timer summary to stderr")
+    parser.add_argument("--telemetry-log", metavar="PATH", default=None,
+                        help="append progress, trace and summary events to this JSON lines file")
+    parser.add_argument("--telemetry-interval", type=float, default=1.0, help="seconds between progress events")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for root-parallel MCTS")
+    parser.add_argument("--backend", choices=["objects", "arrays"], default="objects",
+                        help="placement storage; arrays adds NumPy tables for faster full-cost passes, moves cost the same")
+    parser.add_argument("--cache", default=None, help="design cache file, rebuilt when the CSVs change")
+    parser.add_argument("--plot", metavar="PNG", default=None, help="save the cost curve to this image")
+    args = parser.parse_args(argv)
+    # Every run uses one search mode, so reject options the chosen mode would silently ignore.
+    # --workers sizes the process pool of --partition, so the two go together.
+    modes = [option for option, used in [("--partition", args.partition),
+                                         ("--workers", args.workers > 1 and not args.partition),
+                                         ("--anytime", args.anytime), ("--checkpoint", args.checkpoint is not None)]
+             if used]
+    if len(modes) > 1:
+        parser.error(f"{modes[0]} cannot be combined with {modes[1]}")
+    if args.collisions and not args.overlap_penalty:
+        parser.error("--collisions needs a non-zero --overlap-penalty")
+    if args.tempering is not None and args.tempering < 1:
+        parser.error("--tempering needs at least one replica")
+    if args.tempering and (args.partition or args.workers > 1):
+        parser.error("--tempering cannot be combined with --partition or --workers")
+    if args.tempering and args.rollout == "descent":
+        parser.error("--tempering replaces annealing rollouts and cannot be combined with --rollout descent")
+    if args.partition and args.time_budget is not None:
+        parser.error("--partition does not support --time-budget")
+    if not args.anytime and (args.eval_budget is not None or args.window is not None):
+        parser.error("--eval-budget and --window need --anytime")
+    if args.anytime and all(value is None for value in (args.time_budget, args.eval_budget, args.window, args.iterations)):
+        parser.error("--anytime needs a stopping criterion: --time-budget, --eval-budget, --window or --iterations")
+    return args
 
 if __name__ == "__main__":
-    # Define the file paths for blocks and ports
-    blocks_file = 'tests/new_tests/block_4X.csv'
-    ports_file = 'tests/new_tests/con_4X.csv'
-    output_file = 'tests/new_tests/output_4X.csv'
-    main(blocks_file, ports_file, output_file)
+    args = parse_args()
+    main(args.blocks_file, args.ports_file, args.output_file, iterations=args.iterations,
+         time_budget=args.time_budget, seed=args.seed, workers=args.workers, plot=args.plot, backend=args.backend,
+         cache_file=args.cache, anytime=args.anytime, evaluation_budget=args.eval_budget, window=args.window,
+         warm_start=args.warm_start, rollout=args.rollout, polish=args.polish, collisions=args.collisions,
+         checkpoint_file=args.checkpoint, checkpoint_interval=args.checkpoint_interval, partition=args.partition,
+         moves=args.moves, max_tree_size=args.max_tree_size, progress=args.progress,
+         telemetry_log=args.telemetry_log, telemetry_interval=args.telemetry_interval,
+         overlap_penalty=args.overlap_penalty, tempering=args.tempering)
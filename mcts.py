@@ -1,31 +1,123 @@
 import random
 import time
-import matplotlib.pyplot as plt
 import math
+from copy import deepcopy
 from state import state
+import block_ip
 from block_ip import BlockIP
 from port import Port
-import re
+from connectivity import ConnectivityIndex
+from transposition import TranspositionTable
+from design_io import read_blocks, read_connections, DesignFormatError
+from telemetry import Telemetry
 
 class MCTS:
-    def __init__(self):
+    def __init__(self, backend="objects"):
         # Initialize the MCTS with default values and empty structures.
         self.root = None
+        self.scratch = None  # Reusable state holding the placement of scratch_node
+        self.scratch_node = None
+        self.backend = backend  # "objects" for BlockIP lists, "arrays" for the NumPy ArrayLayout
         self.block_list = []
         self.map_blocks = {}
-        self.map_connectivity = {}
+        self.connection_map = {}  # Backs map_connectivity; None until first use for a design restored from a cache
         self.run_blocks_once = True
         self.run_connectivity_once = True
         self.max_height = 1000
-        self.action_set = []
+        self.actions = []  # Backs action_set; None until first use for a design restored from a cache
+        self.port_actions = []  # action_set compiled to [block index, port index, direction]
+        self.connectivity = None
+        self.tempering = None  # ParallelTempering used in place of simulated_annealing when set
+        self.transposition_size = 100000  # Capacity of the transposition table, 0 disables it
+        self.transpositions = None
+        self.max_tree_size = None  # Cap on tree nodes plus stored port moves, and on transposition moves; None for no limit
+        self.prune_ratio = 0.75  # Fraction of max_tree_size the tree is pruned back to
+        self.node_count = 0  # Nodes in the tree below and including the root
+        self.move_count = 0  # Port moves stored in the deltas of those nodes
+        self.telemetry = Telemetry()  # Disabled until given sinks
+        self.collision_cell = None  # Grid cell size for cross-block port collisions, None to ignore them
+        self.penalty = 0  # Weight of the overlap cost in the total cost, given to the root and scratch states by set_root
+        self.rollout_policy = "anneal"  # "anneal" for simulated_annealing, "descent" for batched steepest descent
+        self.evaluator = None  # MoveEvaluator built by refine on first use
+        self.move_mix = None  # MoveMix of swaps, jumps and group shifts mixed into annealing and rollouts, None for single steps
+        self.trace_interval = 100  # Iterations between trace samples of simulated_annealing(flag=True)
+        self.last_trace = []  # Sampled costs of the last simulated_annealing(flag=True) run
+        self.best_cost = None  # Lowest rollout cost seen by mcts_iteration
+        self.best_locations = None  # Port locations of the placement with best_cost
+        self.deadline = None  # time.perf_counter() value at which annealing and search stop
+        self.evaluations = 0  # Annealing moves evaluated so far
+        self.iterations_done = 0  # MCTS iterations run so far
+        self.root_locations = None  # Port locations of the root placement, recorded by set_root
+        self.max_evaluations = None  # Stop annealing and search once evaluations reaches this
+        self.converge_window = None  # Annealing iterations per convergence check, None to always run to the end
+        self.converge_tol = 1e-3  # Relative cost improvement per window below which annealing stops
         self.alpha = 10
         self.step_decay = 1.0003
 
+    @property
+    def map_connectivity(self):
+        # "block.port" -> [["block.port", frequency], ...] for every connected port, rebuilt from the
+        # connectivity index on first use when the design came from a cache.
+        if self.connection_map is None:
+            self.connection_map = self.connectivity.connection_map()
+        return self.connection_map
+
+    @map_connectivity.setter
+    def map_connectivity(self, value):
+        # Replace the connectivity map.
+        self.connection_map = value
+
+    @property
+    def action_set(self):
+        # [block index, port id, direction] of every action, aligned with port_actions, which the search uses;
+        # rebuilt from port_actions on first use when the design came from a cache.
+        if self.actions is None:
+            self.actions = [[block_index, self.block_list[block_index].get_port_by_index(port_index).get_port_id(), direct]
+                            for block_index, port_index, direct in self.port_actions]
+        return self.actions
+
+    @action_set.setter
+    def action_set(self, value):
+        # Replace the action set.
+        self.actions = value
+
     def set_root(self):
         # Set the root of the MCTS tree.
+        if self.collision_cell is not None and not self.penalty:
+            raise ValueError("cross-block collisions need a non-zero overlap penalty")
         self.root = state(self.block_list)
-        self.root.initialise_class(self.block_list, self.map_blocks, self.map_connectivity, self.action_set)
-        self.root.init_unexplored()
+        self.root.penalty = self.penalty
+        self.root.initialise_class(self.block_list, self.map_blocks, self.port_actions, self.connectivity, self.telemetry,
+                                   self.collision_cell)
+        self.scratch = state(deepcopy(self.block_list))
+        self.scratch.penalty = self.penalty
+        self.scratch_node = self.root
+        self.node_count = 1
+        self.move_count = 0
+        self.root_locations = self.scratch.get_port_locations()
+        self.transpositions = (TranspositionTable(self.transposition_size, self.max_tree_size)
+                               if self.transposition_size else None)
+
+    def goto(self, node):
+        # Rebuild the placement of a tree node in the scratch state by undoing and replaying move deltas.
+        ancestors = set()
+        curr_node = node
+        while curr_node is not None:
+            ancestors.add(id(curr_node))
+            curr_node = curr_node.parent
+        curr_node = self.scratch_node
+        while id(curr_node) not in ancestors:
+            self.scratch.undo_delta(curr_node.delta)
+            curr_node = curr_node.parent
+        path = []
+        path_node = node
+        while path_node is not curr_node:
+            path.append(path_node)
+            path_node = path_node.parent
+        for path_node in reversed(path):
+            self.scratch.apply_delta(path_node.delta)
+        self.scratch_node = node
+        return self.scratch
 
     def preprocess_blocks(self):
         # Process blocks to set up their edges and possible actions.
@@ -35,119 +127,231 @@ class MCTS:
             for port, edge, pos in block.block_ports:
                 self.action_set.append([self.map_blocks[block.get_block_id()], port.get_port_id(), +1])
                 self.action_set.append([self.map_blocks[block.get_block_id()], port.get_port_id(), -1])
+        self.connectivity = ConnectivityIndex(self.block_list, self.map_blocks, self.map_connectivity)
+        self.finish_preprocess()
+
+    def finish_preprocess(self):
+        # Compile the action set to port indices and build the array backend if it is selected.
+        self.port_actions = [[block_id, self.block_list[block_id].get_port_index(port_id), direct]
+                             for block_id, port_id, direct in self.action_set]
+        if self.backend == "arrays":
+            from array_layout import ArrayLayout
+            self.block_list = ArrayLayout(self.block_list, self.connectivity).blocks
+
+    def warm_start(self, rounds=3):
+        # Place ports near the centroid of their connected ports; call after preprocess_blocks and before set_root.
+        from warm_start import warm_start
+        warm_start(self.block_list, self.connectivity, rounds)
+
+    def enable_collisions(self, cell_size=None, penalty=None):
+        # Include collisions between ports of different blocks in the overlap cost, using a uniform grid
+        # with cells of cell_size (default: the mean port length, at least the port width). The overlap cost
+        # only counts when the penalty is non-zero, so set it here or through self.penalty. Call before set_root.
+        if penalty is not None:
+            self.penalty = penalty
+        if cell_size is None:
+            lengths = [block.get_port_by_index(port_index).get_port_length()
+                       for block in self.block_list for port_index in range(len(block.block_ports))]
+            cell_size = max(Port.port_width, sum(lengths) / max(len(lengths), 1))
+        self.collision_cell = cell_size
+
+    def load_design(self, blocks_file, ports_file, cache_file=None):
+        # Parse and preprocess a design, or restore it from cache_file when that is newer than both inputs.
+        # A missing or stale cache is rewritten after parsing.
+        if cache_file is not None:
+            import design_cache
+            if design_cache.load_design(self, cache_file, [blocks_file, ports_file]):
+                return
+        self.parse_blocks(blocks_file)
+        self.parse_ports(ports_file)
+        self.preprocess_blocks()
+        if cache_file is not None:
+            design_cache.save_design(self, cache_file, [blocks_file, ports_file])
 
     def parse_blocks(self, file_path='tests/new_tests/block.csv'):
         # Parse block information from a file.
         if self.run_blocks_once:
             self.block_list = []
             self.map_blocks = {}
-            index = 0
-            with open(file_path) as f:
-                for lines in f:
-                    IP, coords = lines.strip().split(",")
-                    coord_list = []
-                    for coord in re.findall('{(.+?)}', coords):
-                        a, b = coord.split(" ")
-                        coord_list.append([int(a), int(b)])
-                    if coord_list:
-                        curr_block = BlockIP(IP, coord_list, alpha=self.alpha, step_decay=self.step_decay)
-                        self.block_list.append(curr_block)
-                        self.map_blocks[IP] = index
-                        index += 1
+            for IP, coord_list in read_blocks(file_path):
+                self.map_blocks[IP] = len(self.block_list)
+                self.block_list.append(BlockIP(IP, coord_list, alpha=self.alpha, step_decay=self.step_decay))
             self.run_blocks_once = False
 
     def parse_ports(self, file_path='tests/new_tests/con.csv'):
         # Parse port connections from a file.
-        IP_port_pair = {}
         if self.run_connectivity_once:
             self.run_connectivity_once = False
             self.map_connectivity = {}
-            index = 0
-            with open(file_path) as f:
-                for lines in f:
-                    row = lines.strip().split(", ")
-                    if len(row) == 4:
-                        con1, con2, length, freq = row
-                        IP1, port1 = con1.split(".")
-                        IP2, port2 = con2.split(".")
-
-                        if con1 not in IP_port_pair.keys():
-                            port_obj1 = Port(port1, int(length))
-                            self.block_list[self.map_blocks[IP1]].add_port(port_obj1)
-                            IP_port_pair[con1] = 1
-
-                        if con2 not in IP_port_pair.keys():
-                            port_obj2 = Port(port2, int(length))
-                            self.block_list[self.map_blocks[IP2]].add_port(port_obj2)
-                            IP_port_pair[con2] = 1
-
-                        if con1 in self.map_connectivity.keys():
-                            self.map_connectivity[con1].append([con2, int(freq)])
-                        else:
-                            self.map_connectivity[con1] = [[con2, int(freq)]]
-
-                        if con2 in self.map_connectivity.keys():
-                            self.map_connectivity[con2].append([con1, int(freq)])
-                        else:
-                            self.map_connectivity[con2] = [[con1, int(freq)]]
+            map_connectivity = self.map_connectivity
+            for line_no, con1, con2, length, freq in read_connections(file_path):
+                for con, other in ((con1, con2), (con2, con1)):
+                    if con not in map_connectivity:
+                        IP, port = con.split(".")
+                        if IP not in self.map_blocks:
+                            raise DesignFormatError(file_path, line_no, f"unknown block {IP!r} in {con!r}")
+                        self.block_list[self.map_blocks[IP]].add_port(Port(port, length))
+                        map_connectivity[con] = []
+                    map_connectivity[con].append([other, freq])
+
     def simulated_annealing(self, curr_state, temperature=100000, iterations=100000, flag=False): 
         #Perform simulated annealing optimization on the current state.
-        result = []  # Stores cost at each iteration if flag is True.
+        result = []  # Running cost every trace_interval iterations if flag is True.
+        telemetry = self.telemetry
+        start = time.perf_counter() if telemetry.enabled else 0.0
+        uphill = rejected = 0
+        if self.max_evaluations is not None:
+            iterations = max(0, min(iterations, self.max_evaluations - self.evaluations))
+        deadline = self.deadline
+        window = self.converge_window
+        window_cost = curr_state.get_total_cost() if window else 0.0
+        move_mix = self.move_mix
+        done = iterations
 
         for iter in range(iterations):
-            # Choose a random action from the action set.
-            block_id, port_id, direct = random.choice(self.action_set)  
-
-            # Calculate current cost components.
-            curr_block_port_cost = curr_state.cost_block_port(self.block_list[block_id].get_block_id(), port_id)
-            curr_block_overlap_cost = curr_state.blocks[block_id].overlap_cost
-            
-            # Move port according to chosen action.
-            curr_state.blocks[block_id].move_port(curr_state.blocks[block_id].get_port_index(port_id), direct)
+            if deadline is not None and iter & 255 == 0 and time.perf_counter() >= deadline:
+                done = iter
+                break
+            if window and iter and iter % window == 0:
+                # Stop once the last window improved the cost by less than converge_tol.
+                cost = curr_state.get_total_cost()
+                if window_cost - cost < self.converge_tol * abs(window_cost):
+                    done = iter
+                    break
+                window_cost = cost
 
-            # Calculate cost components after the move.
-            next_block_port_cost = curr_state.cost_block_port(self.block_list[block_id].get_block_id(), port_id)
-            next_block_overlap_cost = curr_state.blocks[block_id].overlap_cost
+            # Choose a random action from the action set.
+            block_id, port_index, direct = random.choice(self.port_actions)
 
-            # Calculate the change in cost due to the move.
-            delta = -curr_block_port_cost + next_block_port_cost + (next_block_overlap_cost - curr_block_overlap_cost) * curr_state.penalty
+            # Move port according to chosen action, or make a large move anchored at it, and get the change in cost.
+            large = move_mix.propose(curr_state, block_id, port_index) if move_mix is not None else None
+            if large is None:
+                delta = curr_state.move_port(block_id, port_index, direct)
+            else:
+                delta, undo = large
 
             # If the change in cost is positive, consider undoing the move.
             if delta > 0:
+                uphill += 1
                 p = math.exp(-delta * iter / temperature)
                 if p < 0.5:
                     # Undo the move if acceptance probability is low.
-                    curr_state.blocks[block_id].move_port(curr_state.blocks[block_id].get_port_index(port_id), -direct)
+                    if large is None:
+                        curr_state.move_port(block_id, port_index, -direct)
+                    else:
+                        move_mix.undo(curr_state, undo)
+                    rejected += 1
 
-            # Record the current total cost if flag is True.
-            if flag:
+            # Sample the running total cost if flag is True.
+            if flag and iter % self.trace_interval == 0:
                 result.append(curr_state.get_total_cost())
 
-        # If flag is True, plot the cost over iterations.
+        self.evaluations += done
         if flag:
-            plt.plot(result)
+            self.last_trace = result
+        if telemetry.enabled:
+            telemetry.add_time("anneal", time.perf_counter() - start)
+            telemetry.count("moves", done)
+            telemetry.count("moves_accepted", done - rejected)
+            telemetry.count("moves_rejected", rejected)
+            telemetry.count("moves_uphill", uphill)
+            if flag:
+                telemetry.trace("anneal_cost", result)
 
         # Return the final total cost.
         return curr_state.get_total_cost()
 
+    def refine(self, curr_state, rounds=100, sample=None):
+        #Steepest descent: score all (or `sample` random) actions in one vectorized pass and apply the best
+        #non-conflicting improving moves together, until no move improves. Scored actions count as evaluations,
+        #and the deadline and evaluation budget of anytime runs apply. Returns the total cost.
+        if self.evaluator is None:
+            from refine import MoveEvaluator
+            self.evaluator = MoveEvaluator(self.block_list, self.connectivity, self.port_actions)
+        budget = max(0, self.max_evaluations - self.evaluations) if self.max_evaluations is not None else None
+        scored = self.evaluator.scored
+        cost = self.evaluator.descend(curr_state, rounds, sample, deadline=self.deadline, budget=budget)
+        self.evaluations += self.evaluator.scored - scored
+        return cost
+
+    def temper(self, curr_state, iterations=100000):
+        #Replica-exchange annealing with self.tempering. The moves of all replicas count as evaluations, and the
+        #deadline and evaluation budget of anytime runs apply. Returns the total cost.
+        budget = max(0, self.max_evaluations - self.evaluations) if self.max_evaluations is not None else None
+        moves = self.tempering.moves
+        cost = self.tempering.anneal(curr_state, iterations, deadline=self.deadline, budget=budget)
+        self.evaluations += self.tempering.moves - moves
+        return cost
+
     def expand(self, curr_state):
         #Expand the current state by adding a child state based on the next action.
-        count = len(curr_state.children)
-        block_id, port_id, direct = self.action_set[count]
-        child = copy(curr_state)
-        child.parent = curr_state
-        child.children = []
-        child.blocks = deepcopy(curr_state.blocks)
-        child.blocks[block_id].move_port(child.blocks[block_id].get_port_index(port_id), direct)
-        child.level += 1
-        curr_state.children.append(child)
+        action = curr_state.next_action
+        curr_state.next_action += 1
+        block_id, port_index, direct = self.port_actions[action]
+        placement = self.goto(curr_state)
+        placement.start_journal()
+        placement.move_port(block_id, port_index, direct)
+        child = curr_state.new_child(placement.stop_journal(), action)
+        self.scratch_node = child
+        self.node_count += 1
+        self.move_count += len(child.delta)
+        if self.telemetry.enabled:
+            self.telemetry.count("expansions")
+        if self.transpositions is not None:
+            child.key = placement.get_key()
+            entry = self.transpositions.get(child.key)
+            if entry is not None and entry[0] > 0:
+                # Another path reached the same placement, share its statistics.
+                child.visits, child.cost = entry[0], entry[1]
         return child
 
+    def prune_tree(self):
+        #Remove the least visited subtrees, children of the root included, until the nodes plus stored port moves
+        #are back to prune_ratio * max_tree_size. backup already added every rollout of a removed subtree to its
+        #ancestors, so their statistics keep what it learned. A node left without children expands all its
+        #actions again.
+        nodes = []
+        stack = list(self.root.children)
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(node.children)
+        nodes.sort(key=lambda node: node.visits)
+        target = int(self.max_tree_size * self.prune_ratio)
+        removed = set()
+        cut = {}  # Parent -> positions of its removed children
+        for node in nodes:
+            if self.node_count + self.move_count <= target:
+                break
+            if id(node) in removed:
+                continue
+            stack = [node]
+            while stack:
+                child = stack.pop()
+                removed.add(id(child))
+                self.node_count -= 1
+                self.move_count -= len(child.delta)
+                stack.extend(grandchild for grandchild in child.children if id(grandchild) not in removed)
+            cut.setdefault(node.parent, set()).add(node.index)
+        for parent, indices in cut.items():
+            if id(parent) not in removed:
+                parent.remove_children(indices)
+        if id(self.scratch_node) in removed:
+            # Detach the scratch placement from the pruned nodes so they can be freed.
+            self.goto(self.root)
+        if self.telemetry.enabled:
+            self.telemetry.count("pruned_subtrees", len(cut))
+
+    def set_delta(self, node, delta):
+        #Replace the move delta of a tree node, keeping move_count up to date.
+        self.move_count += len(delta) - len(node.delta)
+        node.delta = delta
+
     def tree_policy(self, curr_state):
         #Determines the next state to visit in the MCTS.
         level = 1
         for i in range(self.max_height):
-            if len(curr_state.children) != len(self.action_set):
+            if curr_state.next_action < len(self.port_actions):
                 return [self.expand(curr_state), level]
             else:
                 curr_state = curr_state.best_child()
@@ -156,36 +360,163 @@ class MCTS:
 
     def default_policy(self, curr_state):
         #Default policy for MCTS, selects random actions.
-        next_state = deepcopy(curr_state)
+        next_state = self.goto(curr_state)
+        next_state.start_journal()
         level = 1
-        for index in range(next_state.level, next_state.level + 100):
-            rand_index = random.choice(range(len(self.action_set)))
-            block_id, port_id, direct = self.action_set[rand_index]
-            next_state.blocks[block_id].move_port(next_state.blocks[block_id].get_port_index(port_id), direct)
+        for index in range(curr_state.level, curr_state.level + 100):
+            rand_index = random.choice(range(len(self.port_actions)))
+            block_id, port_index, direct = self.port_actions[rand_index]
+            if self.move_mix is None or self.move_mix.propose(next_state, block_id, port_index) is None:
+                next_state.move_port(block_id, port_index, direct)
             level += 1
-        return [next_state.get_total_cost(), level]
+        cost = next_state.get_total_cost()
+        next_state.undo_delta(next_state.stop_journal())
+        return [cost, level]
 
     def backup(self, curr_node, cost):
         #Backpropagates the cost through the path of visited nodes.
         while curr_node.level != 0:
-            curr_node.visit()
-            curr_node.cost += cost
-            curr_node = curr_node.parent
+            parent = curr_node.parent
+            parent.child_visits[curr_node.index] += 1
+            parent.child_cost[curr_node.index] += cost
+            if self.transpositions is not None and curr_node.key is not None:
+                self.transpositions.add_visit(curr_node.key, cost)
+            curr_node = parent
 
     def traverse_final(self, curr_state):
-        #Traverses the tree to find the final state.
+        #Traverses the tree to find the final state and returns the scratch state holding its placement.
         while len(curr_state.children) != 0:
             curr_state = curr_state.best_child_traverse()
-        return curr_state
+        return self.goto(curr_state)
+
+    def mcts_iteration(self, root):
+        #Run one select / anneal / backup iteration and return the evaluated node and its cost.
+        telemetry = self.telemetry
+        s, level = self.tree_policy(root)
+        start = time.perf_counter() if telemetry.enabled else 0.0
+        placement = self.goto(s)
+        if telemetry.enabled:
+            telemetry.add_time("goto", time.perf_counter() - start)
+        # A leaf keeps its annealed placement; deltas of existing children start from the current one.
+        keep = not s.children and s.parent is not None
+        entry = self.transpositions.get(s.key) if keep and s.key is not None and self.transpositions is not None else None
+        if entry is not None:
+            # This placement was annealed before, reuse the result instead of annealing it again.
+            cost = entry[2]
+            if telemetry.enabled:
+                telemetry.count("rollouts_reused")
+            placement.apply_delta(entry[3])
+            self.set_delta(s, state.merge_delta(s.delta, entry[3]))
+            self.track_best(placement, cost)
+        else:
+            placement.start_journal()
+            if telemetry.enabled:
+                telemetry.count("rollouts")
+            if self.tempering is not None:
+                cost = self.temper(placement, iterations=level * 1000)
+            elif self.rollout_policy == "descent":
+                cost = self.refine(placement, rounds=level * 10)
+            else:
+                cost = self.simulated_annealing(placement, iterations=level * 1000, temperature=level * 1000)
+            self.track_best(placement, cost)
+            anneal_delta = placement.stop_journal()
+            if keep:
+                self.set_delta(s, state.merge_delta(s.delta, anneal_delta))
+                if s.key is not None and self.transpositions is not None:
+                    self.transpositions.put(s.key, [0, 0.0, cost, anneal_delta])
+            else:
+                placement.undo_delta(anneal_delta)
+        self.backup(s, cost)
+        if self.max_tree_size is not None and self.node_count + self.move_count > self.max_tree_size:
+            self.prune_tree()
+        block_ip.global_t += 1
+        self.iterations_done += 1
+        if telemetry.enabled:
+            telemetry.count("iterations")
+            telemetry.progress(iteration=block_ip.global_t - 1, cost=cost, best_cost=self.best_cost,
+                               tree_size=self.node_count)
+        return s, cost
+
+    def track_best(self, placement, cost):
+        #Remember the placement if its cost is the lowest seen so far.
+        if self.best_cost is None or cost < self.best_cost:
+            self.best_cost = cost
+            self.best_locations = placement.get_port_locations()
+
+    def perform_anytime(self, root, time_budget=None, evaluation_budget=None, window=None, anneal_window=None,
+                        tolerance=1e-3, max_iterations=None):
+        #Run MCTS until the time or evaluation budget runs out, the best cost improved by less than tolerance
+        #(relative) over the last window iterations, or the run is interrupted. Annealing runs stop early when
+        #they improve by less than tolerance over anneal_window moves. Returns a state holding the best
+        #placement seen and the rollout costs.
+        outputs = []
+        best_history = []
+        self.deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        self.max_evaluations = self.evaluations + evaluation_budget if evaluation_budget is not None else None
+        self.converge_window = anneal_window
+        self.converge_tol = tolerance
+        try:
+            while max_iterations is None or len(outputs) < max_iterations:
+                if self.deadline is not None and time.perf_counter() >= self.deadline:
+                    break
+                if self.max_evaluations is not None and self.evaluations >= self.max_evaluations:
+                    break
+                s, cost = self.mcts_iteration(root)
+                outputs.append(cost)
+                best_history.append(self.best_cost)
+                if window and len(best_history) > window:
+                    previous = best_history[-window - 1]
+                    if previous - self.best_cost < tolerance * abs(previous):
+                        break
+        except KeyboardInterrupt:
+            if self.scratch.journal is not None:
+                # Interrupted inside a rollout, put the scratch state back on its node's placement.
+                self.scratch.undo_delta(self.scratch.stop_journal())
+        finally:
+            self.deadline = None
+            self.max_evaluations = None
+            self.converge_window = None
+        best = state(deepcopy(self.block_list))
+        best.penalty = self.penalty
+        if self.best_locations is not None:
+            best.set_port_locations(self.best_locations)
+        best.refresh_cost()
+        return best, outputs
 
-    def perform_MCTS(self, root):
-        #Perform the Monte Carlo Tree Search.
-        global global_t
+    def perform_MCTS(self, root, iterations=1000, time_budget=None, checkpoint=None):
+        #Perform the Monte Carlo Tree Search, stopping early once time_budget seconds have passed.
+        #With a Checkpointer, the run is saved periodically and once more at the end.
         outputs = []
-        for i in range(1000):
-            s, level = self.tree_policy(root)
-            cost = self.simulated_annealing(s, iterations=level * 1000, temperature=level * 1000)
+        start = time.perf_counter()
+        for i in range(iterations):
+            s, cost = self.mcts_iteration(root)
             outputs.append(cost)
-            self.backup(s, cost)
-            global_t += 1
-        return outputs
\ No newline at end of file
+            if checkpoint is not None:
+                checkpoint.maybe_save(self, outputs)
+            if time_budget is not None and time.perf_counter() - start >= time_budget:
+                break
+        if checkpoint is not None:
+            checkpoint.save(self, outputs)
+        return outputs
+
+    def perform_partitioned(self, clusters=4, workers=None, iterations=100, refine_iterations=10000, seed=0):
+        #Optimize loosely coupled block clusters independently in worker processes, then refine across them.
+        #Returns the final state and the clusters as lists of block indices.
+        from partition import optimize_partitioned
+        return optimize_partitioned(self, clusters, workers, iterations, refine_iterations, seed)
+
+    def resume_checkpoint(self, file_path, checkpoint=None):
+        #Restore the tree, best placement, RNG and counters saved in file_path; call after load_design and
+        #warm_start instead of set_root. Returns the costs so far, or None (after set_root) if there is no file.
+        from checkpoint import resume
+        outputs = resume(self, file_path, checkpoint)
+        if outputs is None:
+            self.set_root()
+        else:
+            self.node_count, self.move_count = self.root.tree_size()
+        return outputs
+
+    def perform_parallel_MCTS(self, workers=4, iterations=1000, sync_interval=50, seed=0, time_budget=None):
+        #Run root-parallel MCTS in worker processes and return the best final placement and per-worker costs.
+        from parallel_mcts import root_parallel_MCTS
+        return root_parallel_MCTS(self, workers, iterations, sync_interval, seed, time_budget)
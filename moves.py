@@ -0,0 +1,60 @@
+import random
+
+class MoveMix:
+    # Large-neighborhood moves drawn in place of single port steps with the given probabilities:
+    # swapping two ports of a block, jumping a port anywhere on its block perimeter, and shifting
+    # a group of up to `group` neighbouring ports on an edge together.
+
+    def __init__(self, swap=0.0, jump=0.0, shift=0.0, group=3):
+        # Initialize the move probabilities; the remainder is left to single steps.
+        if min(swap, jump, shift) < 0 or swap + jump + shift > 1:
+            raise ValueError("move probabilities must be non-negative and sum to at most 1")
+        self.swap = swap
+        self.jump = jump
+        self.shift = shift
+        self.group = group
+
+    def propose(self, curr_state, block_index, port_index):
+        # Apply a random large move anchored at the given port. Returns the change in total cost and the
+        # [block index, port index, edge, pos] locations that undo it, or None when a single step should be used.
+        draw = random.random()
+        if draw >= self.swap + self.jump + self.shift:
+            return None
+        block = curr_state.blocks[block_index]
+        num_ports = len(block.map_port)
+        if draw < self.swap:
+            if num_ports < 2:
+                return None
+            other = random.randrange(num_ports - 1)
+            if other >= port_index:
+                other += 1
+            moved = [port_index, other]
+            undo = [[block_index, index, *block.get_port_location(index)] for index in moved]
+            return curr_state.swap_ports(block_index, port_index, other), undo
+        if draw < self.swap + self.jump:
+            undo = [[block_index, port_index, *block.get_port_location(port_index)]]
+            edge, pos = block.perimeter_location(random.randrange(int(block.perimeter[-1])))
+            return curr_state.jump_port(block_index, port_index, edge, pos), undo
+        moved = self.neighbours(block, port_index)
+        undo = [[block_index, index, *block.get_port_location(index)] for index in moved]
+        edge, pos = block.get_port_location(port_index)
+        reach = max(1, block.edges[edge][0] // 4)
+        distance = random.randint(1, reach) * random.choice((-1, 1))
+        return curr_state.shift_ports(block_index, moved, distance), undo
+
+    def neighbours(self, block, port_index):
+        # The port and the ports closest to it on the same edge, at most `group` in total.
+        edge, pos = block.get_port_location(port_index)
+        same_edge = []
+        for index in range(len(block.map_port)):
+            other_edge, other_pos = block.get_port_location(index)
+            if other_edge == edge:
+                same_edge.append((abs(other_pos - pos), index))
+        same_edge.sort()
+        return [index for distance, index in same_edge[:self.group]]
+
+    @staticmethod
+    def undo(curr_state, undo):
+        # Put the ports moved by propose back where they were.
+        for block_index, port_index, edge, pos in reversed(undo):
+            curr_state.place_port(block_index, port_index, edge, pos)
@@ -0,0 +1,105 @@
+import time
+import random
+import multiprocessing
+from copy import copy, deepcopy
+import block_ip
+from state import state
+from telemetry import Telemetry
+
+def design_copy(obj):
+    # Shallow copy of a preprocessed MCTS without its tree or worker pools, cheap to send to a worker process.
+    worker_obj = copy(obj)
+    worker_obj.root = worker_obj.scratch = worker_obj.scratch_node = None
+    worker_obj.tempering = None
+    worker_obj.telemetry = Telemetry()
+    return worker_obj
+
+def run_worker(obj, seed, iterations, sync_interval, conn):
+    # Run an independent search tree, exchanging first-level child statistics with the other workers.
+    random.seed(seed)
+    block_ip.global_t = 1
+    obj.set_root()
+    root = obj.root
+    outputs = []
+    local = {}  # Action of a root child -> [visits, cost] added by this worker since the last sync
+    pending = {}  # Action of a root child -> [visits, cost] added by other workers to children not expanded here yet
+    for start in range(0, iterations, sync_interval):
+        for i in range(start, min(start + sync_interval, iterations)):
+            s, cost = obj.mcts_iteration(root)
+            outputs.append(cost)
+            node = s
+            while node.level > 1:
+                node = node.parent
+            if node.level == 1:
+                stats = local.setdefault(node.action, [0, 0.0])
+                stats[0] += 1
+                stats[1] += cost
+        conn.send(("sync", local))
+        local = {}
+        others, stop = conn.recv()
+        for action, (visits, cost_sum) in others.items():
+            stats = pending.setdefault(action, [0, 0.0])
+            stats[0] += visits
+            stats[1] += cost_sum
+        children = {child.action: child for child in root.children}
+        for action in [action for action in pending if action in children]:
+            visits, cost_sum = pending.pop(action)
+            children[action].visits += visits
+            children[action].cost += cost_sum
+        if stop:
+            break
+
+    final = obj.traverse_final(root)
+    conn.send(("done", final.get_total_cost(), final.get_port_locations(), outputs))
+    conn.close()
+
+def root_parallel_MCTS(obj, workers=4, iterations=1000, sync_interval=50, seed=0, time_budget=None):
+    # Root-parallel MCTS: independent trees with different seeds, merging first-level child visits and
+    # costs every sync_interval iterations. Workers stop at the first sync after time_budget seconds.
+    # Returns the state holding the lowest cost traverse_final placement over all workers, and the
+    # list of costs of every worker.
+    start = time.perf_counter()
+    worker_obj = design_copy(obj)
+    conns = []
+    procs = []
+    for worker in range(workers):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        proc = multiprocessing.Process(target=run_worker, args=(worker_obj, seed + worker, iterations, sync_interval, child_conn))
+        proc.start()
+        child_conn.close()
+        conns.append(parent_conn)
+        procs.append(proc)
+
+    results = [None] * workers
+    try:
+        while None in results:
+            messages = [conn.recv() for conn in conns]
+            if messages[0][0] == "sync":
+                stop = time_budget is not None and time.perf_counter() - start >= time_budget
+                total = {}
+                for kind, local in messages:
+                    for index, (visits, cost) in local.items():
+                        stats = total.setdefault(index, [0, 0.0])
+                        stats[0] += visits
+                        stats[1] += cost
+                for conn, (kind, local) in zip(conns, messages):
+                    others = {}
+                    for index, (visits, cost) in total.items():
+                        own_visits, own_cost = local.get(index, (0, 0.0))
+                        if visits != own_visits:
+                            others[index] = [visits - own_visits, cost - own_cost]
+                    conn.send((others, stop))
+            else:
+                results = messages
+    finally:
+        for proc in procs:
+            proc.join()
+
+    kind, cost, locations, outputs = min(results, key=lambda result: result[1])
+    if obj.root is None:
+        obj.set_root()
+    final = state(deepcopy(obj.block_list))
+    final.penalty = obj.penalty
+    final.set_port_locations(locations)
+    final.refresh_cost()
+    return final, [result[3] for result in results]
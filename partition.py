@@ -0,0 +1,114 @@
+import random
+import multiprocessing
+from copy import deepcopy
+import block_ip
+from state import state
+from parallel_mcts import design_copy
+
+def block_graph(obj):
+    # Weighted block adjacency: every net between two blocks adds its frequency to their edge.
+    connectivity = obj.connectivity
+    port_block = connectivity.port_block
+    graph = [{} for block in obj.block_list]
+    for port_id in range(connectivity.num_ports()):
+        block1 = port_block[port_id]
+        for offset in range(connectivity.offsets[port_id], connectivity.offsets[port_id + 1]):
+            block2 = port_block[connectivity.neighbors[offset]]
+            if block1 != block2:
+                graph[block1][block2] = graph[block1].get(block2, 0) + max(connectivity.freqs[offset], 1)
+    return graph
+
+def partition_blocks(obj, clusters=4, imbalance=1.2):
+    # Split the blocks into at most `clusters` loosely coupled groups by greedily merging the pair of
+    # groups with the heaviest connection per port, keeping every group under imbalance times the mean
+    # port count. Returns lists of block indices.
+    graph = block_graph(obj)
+    sizes = {block_index: max(len(block.block_ports), 1) for block_index, block in enumerate(obj.block_list)}
+    members = {block_index: [block_index] for block_index in sizes}
+    links = {block_index: dict(graph[block_index]) for block_index in sizes}
+    cap = imbalance * sum(sizes.values()) / max(clusters, 1)
+    while len(members) > clusters:
+        best = None
+        for a in links:
+            for b, weight in links[a].items():
+                if a < b and sizes[a] + sizes[b] <= cap:
+                    score = weight / (sizes[a] + sizes[b])
+                    if best is None or score > best[0]:
+                        best = (score, a, b)
+        if best is None:
+            # No connected pair fits under the cap, merge the two smallest groups.
+            a, b = sorted(members, key=lambda group: sizes[group])[:2]
+        else:
+            a, b = best[1], best[2]
+        members[a] += members.pop(b)
+        sizes[a] += sizes.pop(b)
+        for other, weight in links.pop(b).items():
+            if other == a:
+                continue
+            links[a][other] = links[a].get(other, 0) + weight
+            links[other][a] = links[other].get(a, 0) + weight
+            del links[other][b]
+        links[a].pop(b, None)
+    return [sorted(group) for group in members.values()]
+
+def restrict_actions(obj, blocks):
+    # Keep only the actions that move ports of the given blocks.
+    keep = set(blocks)
+    obj.action_set = [action for action in obj.action_set if action[0] in keep]
+    obj.port_actions = [action for action in obj.port_actions if action[0] in keep]
+
+def optimize_cluster(obj, blocks, locations, iterations, seed):
+    # Run MCTS on one cluster with every port outside it held fixed; return the new locations of its blocks.
+    random.seed(seed)
+    block_ip.global_t = 1
+    for block, block_locations in zip(obj.block_list, locations):
+        for port_index, (edge, pos) in enumerate(block_locations):
+            block.place_port(port_index, edge, pos)
+    restrict_actions(obj, blocks)
+    obj.set_root()
+    obj.perform_MCTS(obj.root, iterations)
+    final_locations = obj.traverse_final(obj.root).get_port_locations()
+    return {block_index: final_locations[block_index] for block_index in blocks}
+
+def optimize_partitioned(obj, clusters=4, workers=None, iterations=100, refine_iterations=10000, seed=0):
+    # Partition the blocks, optimize every cluster with MCTS in a worker process, stitch the results
+    # together and anneal the ports with nets crossing clusters. Returns the final state and the clusters.
+    parts = partition_blocks(obj, clusters)
+    if obj.root is None:
+        obj.set_root()
+    locations = obj.root_locations
+    worker_obj = design_copy(obj)
+    with multiprocessing.Pool(workers or len(parts)) as pool:
+        results = pool.starmap(optimize_cluster, [(worker_obj, blocks, locations, iterations, seed + index)
+                                                  for index, blocks in enumerate(parts)])
+    stitched = [list(block_locations) for block_locations in locations]
+    for result in results:
+        for block_index, block_locations in result.items():
+            stitched[block_index] = block_locations
+
+    final = state(deepcopy(obj.block_list))
+    final.penalty = obj.penalty
+    final.set_port_locations(stitched)
+    final.refresh_cost()
+
+    # Short global refinement of the ports on nets that cross clusters.
+    cluster_of = {}
+    for index, blocks in enumerate(parts):
+        for block_index in blocks:
+            cluster_of[block_index] = index
+    connectivity = obj.connectivity
+    boundary = set()
+    for port_id in range(connectivity.num_ports()):
+        cluster = cluster_of[connectivity.port_block[port_id]]
+        for neighbor in connectivity.neighbors[connectivity.offsets[port_id]:connectivity.offsets[port_id + 1]]:
+            if cluster_of[connectivity.port_block[neighbor]] != cluster:
+                boundary.add((connectivity.port_block[port_id], connectivity.port_index[port_id]))
+                break
+    port_actions = obj.port_actions
+    obj.port_actions = [action for action in port_actions if (action[0], action[1]) in boundary]
+    try:
+        if obj.port_actions and refine_iterations:
+            obj.simulated_annealing(final, iterations=refine_iterations, temperature=refine_iterations)
+    finally:
+        obj.port_actions = port_actions
+    return final, parts
@@ -0,0 +1,149 @@
+import time
+import numpy as np
+import block_ip
+from port import Port
+
+class MoveEvaluator:
+    # Scores the wirelength and overlap change of many port_actions at once with NumPy, and applies the
+    # best non-conflicting improving moves together (steepest descent).
+
+    def __init__(self, block_list, connectivity, port_actions):
+        # Build the static port, edge, net and action tables of a preprocessed design.
+        self.connectivity = connectivity
+        self.num_ports = connectivity.num_ports()
+        self.port_block = np.array(connectivity.port_block, dtype=np.int64)
+        self.port_length = np.array([block.get_port_by_index(port_index).get_port_length()
+                                     for block in block_list for port_index in range(len(block.block_ports))], dtype=np.int64)
+        self.block_start = np.array([ids[0] if ids else 0 for ids in connectivity.port_ids], dtype=np.int64)
+        self.block_size = np.array([len(ids) for ids in connectivity.port_ids], dtype=np.int64)
+        self.num_edges = np.array([len(block.edges) for block in block_list], dtype=np.int64)
+        self.edge_offset = np.concatenate(([0], np.cumsum(self.num_edges)[:-1])).astype(np.int64)
+        geometry = np.array([geometry for block in block_list for geometry in block.edge_geometry], dtype=np.float64).reshape(-1, 6)
+        self.corner_x, self.corner_y, self.ux, self.uy, self.nx, self.ny = geometry.T
+        self.edge_len = np.array([length for block in block_list for length, direct in block.edges], dtype=np.int64)
+        self.alpha = np.array([block.alpha for block in block_list], dtype=np.float64)
+        self.step_decay = np.array([block.step_decay for block in block_list], dtype=np.float64)
+
+        self.offsets = np.array(connectivity.offsets, dtype=np.int64)
+        self.neighbors = np.array(connectivity.neighbors, dtype=np.int64)
+        actions = np.array(port_actions, dtype=np.int64).reshape(-1, 3)
+        self.action_block = actions[:, 0]
+        self.action_index = actions[:, 1]
+        self.action_port = self.block_start[self.action_block] + self.action_index
+        self.action_direct = actions[:, 2]
+        self.scored = 0  # Actions scored by descend so far
+
+    def centers(self, blocks, edges, pos, lengths):
+        # Centers of ports of the given blocks placed at (edge, pos).
+        global_edges = self.edge_offset[blocks] + edges
+        along = pos + lengths / 2.0
+        half_width = Port.port_width / 2.0
+        x = self.corner_x[global_edges] + along * self.ux[global_edges] + half_width * self.nx[global_edges]
+        y = self.corner_y[global_edges] + along * self.uy[global_edges] + half_width * self.ny[global_edges]
+        return x, y
+
+    def targets(self, edge, pos, actions):
+        # Edge and position every action moves its port to, as BlockIP.next_position computes them.
+        blocks = self.action_block[actions]
+        ports = self.action_port[actions]
+        lengths = self.port_length[ports]
+        steps = np.maximum(1, (self.alpha[blocks] - self.step_decay[blocks] ** block_ip.global_t).astype(np.int64))
+        new_edge = edge[ports].copy()
+        new_pos = pos[ports] + self.action_direct[actions] * steps
+        edge_len = self.edge_len[self.edge_offset[blocks] + new_edge]
+        before = new_pos < 0
+        after = ~before & (new_pos + lengths > edge_len)
+        previous_edge = (new_edge - 1) % self.num_edges[blocks]
+        new_edge[before] = previous_edge[before]
+        new_pos[before] = self.edge_len[self.edge_offset[blocks] + previous_edge][before] - lengths[before]
+        new_edge[after] = ((new_edge + 1) % self.num_edges[blocks])[after]
+        new_pos[after] = 0
+        return new_edge, new_pos
+
+    def score(self, curr_state, actions=None):
+        # Return the actions, their target locations and the change in total cost of each.
+        if actions is None:
+            actions = np.arange(len(self.action_block))
+        locations = np.array([location for block_locations in curr_state.get_port_locations()
+                              for location in block_locations], dtype=np.int64).reshape(-1, 2)
+        edge, pos = locations[:, 0], locations[:, 1]
+        new_edge, new_pos = self.targets(edge, pos, actions)
+        ports = self.action_port[actions]
+        blocks = self.action_block[actions]
+        lengths = self.port_length[ports]
+
+        # Wirelength: distances from the old and new centers to every connected port.
+        x, y = self.centers(self.port_block, edge, pos, self.port_length)
+        new_x, new_y = self.centers(blocks, new_edge, new_pos, lengths)
+        degree = self.offsets[ports + 1] - self.offsets[ports]
+        owner = np.repeat(np.arange(len(actions)), degree)
+        starts = np.repeat(self.offsets[ports] - np.cumsum(np.concatenate(([0], degree[:-1]))), degree)
+        others = self.neighbors[starts + np.arange(degree.sum())]
+        wire = (np.hypot(new_x[owner] - x[others], new_y[owner] - y[others])
+                - np.hypot(x[ports][owner] - x[others], y[ports][owner] - y[others]))
+        wire_delta = np.bincount(owner, weights=wire, minlength=len(actions))
+
+        # Overlap: intervals of the old and new location against every other port of the same block.
+        size = self.block_size[blocks]
+        owner = np.repeat(np.arange(len(actions)), size)
+        starts = np.repeat(self.block_start[blocks] - np.cumsum(np.concatenate(([0], size[:-1]))), size)
+        others = starts + np.arange(size.sum())
+        other_end = pos[others] + self.port_length[others]
+        not_self = others != ports[owner]
+        old = np.minimum(other_end, pos[ports][owner] + lengths[owner]) - np.maximum(pos[others], pos[ports][owner])
+        new = np.minimum(other_end, new_pos[owner] + lengths[owner]) - np.maximum(pos[others], new_pos[owner])
+        old = np.where(not_self & (edge[others] == edge[ports][owner]) & (old > 0), old, 0)
+        new = np.where(not_self & (edge[others] == new_edge[owner]) & (new > 0), new, 0)
+        overlap_delta = np.bincount(owner, weights=new - old, minlength=len(actions))
+        return actions, new_edge, new_pos, wire_delta + curr_state.penalty * overlap_delta
+
+    def descend(self, curr_state, rounds=100, sample=None, rng=None, deadline=None, budget=None):
+        # Apply batches of improving moves until none is left or rounds run out, returning the total cost.
+        # Moves in a batch touch different ports, no two of them are connected by a net and no two touch
+        # the same block edge, so their scored deltas add up. Scores leave out cross-block collisions, so a
+        # move is kept only if the change place_port reports is still an improvement, and undone otherwise.
+        # With sample set, each round scores a random subset of that many actions. Rounds stop at the
+        # time.perf_counter() deadline, and at most budget actions are scored; scored counts them across calls.
+        rng = rng or np.random.default_rng()
+        num_actions = len(self.action_block)
+        remaining = budget
+        for round_index in range(rounds):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            size = sample if sample is not None and sample < num_actions else num_actions
+            if remaining is not None:
+                if remaining <= 0:
+                    break
+                size = min(size, remaining)
+            actions = None
+            if size < num_actions:
+                actions = rng.choice(num_actions, size=size, replace=False)
+            actions, new_edge, new_pos, delta = self.score(curr_state, actions)
+            self.scored += size
+            if remaining is not None:
+                remaining -= size
+            improving = np.flatnonzero(delta < -1e-9)
+            if len(improving) == 0:
+                break
+            busy_ports = set()
+            busy_edges = set()
+            applied = 0
+            for candidate in improving[np.argsort(delta[improving], kind="stable")].tolist():
+                action = actions[candidate]
+                port_id = self.action_port.item(action)
+                block = self.action_block.item(action)
+                block_index = self.action_index.item(action)
+                edge, pos = curr_state.blocks[block].get_port_location(block_index)
+                edges = {(block, edge), (block, new_edge.item(candidate))}
+                if port_id in busy_ports or busy_edges & edges:
+                    continue
+                if curr_state.place_port(block, block_index, new_edge.item(candidate), new_pos.item(candidate)) >= -1e-9:
+                    curr_state.place_port(block, block_index, edge, pos)
+                    continue
+                applied += 1
+                busy_ports.add(port_id)
+                busy_ports.update(self.neighbors[self.offsets[port_id]:self.offsets[port_id + 1]].tolist())
+                busy_edges |= edges
+            if applied == 0 and sample is None:
+                break
+        return curr_state.get_total_cost()
@@ -0,0 +1,68 @@
+from port import Port
+
+class PortGrid:
+    # Uniform grid over the chip with the rectangle of every port in the cells it touches, so the ports
+    # a moved port can collide with are found by looking at a few cells. Collision cost between two ports
+    # of different blocks is their intersection area divided by Port.port_width, which matches the
+    # length-based overlap of ports on the same edge.
+
+    def __init__(self, cell_size):
+        # Initialize an empty grid with square cells of the given size.
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> set of port ids
+        self.rects = {}  # Port id -> (x_min, y_min, x_max, y_max, block index)
+        self.total = 0.0  # Collision cost summed over all pairs
+
+    def cell_range(self, rect):
+        # Columns and rows of the cells a rectangle touches.
+        size = self.cell_size
+        return (range(int(rect[0] // size), int(rect[2] // size) + 1),
+                range(int(rect[1] // size), int(rect[3] // size) + 1))
+
+    def collision(self, port_id, rect):
+        # Collision cost of a rectangle with the stored ports of other blocks.
+        x_min, y_min, x_max, y_max, block_index = rect
+        columns, rows = self.cell_range(rect)
+        seen = set()
+        cost = 0.0
+        for column in columns:
+            for row in rows:
+                for other in self.cells.get((column, row), ()):
+                    if other in seen or other == port_id:
+                        continue
+                    seen.add(other)
+                    other_rect = self.rects[other]
+                    if other_rect[4] == block_index:
+                        continue
+                    width = min(x_max, other_rect[2]) - max(x_min, other_rect[0])
+                    height = min(y_max, other_rect[3]) - max(y_min, other_rect[1])
+                    if width > 0 and height > 0:
+                        cost += width * height
+        return cost / Port.port_width
+
+    def insert(self, port_id, block_index, corners):
+        # Store a port from its [x_l, y_l, x_r, y_r] corners and return its collision cost.
+        x_l, y_l, x_r, y_r = corners
+        rect = (min(x_l, x_r), min(y_l, y_r), max(x_l, x_r), max(y_l, y_r), block_index)
+        cost = self.collision(port_id, rect)
+        self.rects[port_id] = rect
+        columns, rows = self.cell_range(rect)
+        for column in columns:
+            for row in rows:
+                self.cells.setdefault((column, row), set()).add(port_id)
+        self.total += cost
+        return cost
+
+    def remove(self, port_id):
+        # Remove a port and return the collision cost it had.
+        rect = self.rects.pop(port_id)
+        columns, rows = self.cell_range(rect)
+        for column in columns:
+            for row in rows:
+                cell = self.cells[(column, row)]
+                cell.discard(port_id)
+                if not cell:
+                    del self.cells[(column, row)]
+        cost = self.collision(port_id, rect)
+        self.total -= cost
+        return cost
@@ -1,115 +1,326 @@
 import math
+from array import array
 from copy import copy, deepcopy
+import block_ip
 from block_ip import BlockIP
+from spatial_grid import PortGrid
 
 class state:
     # Class variables for shared resources
     block_list = []
     map_blocks = {}
-    map_connectivity = {}
-    action_set = []
+    action_set = []  # port_actions of the MCTS, which node actions index
+    connectivity = None  # Compiled ConnectivityIndex shared by all states
+    telemetry = None  # Telemetry of the MCTS that owns the states
+    collision_cell = None  # Cell size of the cross-block collision grid, None to ignore cross-block collisions
 
-    def __init__(self, blocks):
+    eps = 30  # Exploration parameter
+    vector_fanout = 32  # Children from which selection scans the statistics with NumPy instead of a Python loop
+    # Nodes are created by the million on large designs, so they carry fixed slots instead of a __dict__.
+    __slots__ = ("blocks", "own_visits", "own_cost", "index", "action", "next_action", "child_visits", "child_cost", "children",
+                 "parent", "penalty", "level", "wire_cost", "overlap_total", "delta", "journal", "key", "grid")
+
+    def __init__(self, blocks, delta=None):
         # Initialize a new state instance
-        self.blocks = copy(blocks)
-        self.visits = 0
-        self.cost = 0.0
+        self.blocks = copy(blocks)  # Placement, only held by the root and scratch states
+        self.own_visits = 0  # Statistics of a node without a parent, others live in the parent's child arrays
+        self.own_cost = 0.0
+        self.index = 0  # Position in the parent's children and child statistics
+        self.action = None  # Index in action_set of the move that expanded this node from its parent
+        self.next_action = 0  # Index in action_set of the next action to expand; the ones before it were expanded
+        self.child_visits = None  # Visit counts of the children, array('q') allocated with the first child
+        self.child_cost = None  # Cost sums of the children, array('d') allocated with the first child
         self.children = []  # Child nodes for this state
         self.parent = None  # Parent of this state
-        self.unexplored = []  # Unexplored actions
-        self.count_child = 0  # Number of child nodes
-        self.eps = 30  # Exploration parameter
         self.penalty = 0  # Penalty for overlap
         self.level = 0  # Depth level in the MCTS tree
-        self.init_unexplored()
+        self.wire_cost = None  # Running connection cost, None until first computed
+        self.overlap_total = 0  # Running overlap cost, valid when wire_cost is set
+        self.delta = delta if delta is not None else []  # Port moves from the parent's placement, see stop_journal
+        self.journal = None  # First location of every port moved since start_journal, None when not recording
+        self.key = None  # Zobrist hash of the placement the node was expanded to
+        self.grid = None  # PortGrid of the placement, built by refresh_cost when collision_cell is set
 
     @classmethod
-    def initialise_class(cls, block_list, map_blocks, map_connectivity, action_set):
+    def initialise_class(cls, block_list, map_blocks, action_set, connectivity=None, telemetry=None,
+                         collision_cell=None):
         # Class method to initialize class variables
+        cls.telemetry = telemetry
+        cls.collision_cell = collision_cell
         cls.block_list = block_list
         cls.map_blocks = map_blocks
-        cls.map_connectivity = map_connectivity
         cls.action_set = action_set
+        cls.connectivity = connectivity
+
+    @property
+    def unexplored(self):
+        # Indices of the actions not expanded yet; actions are expanded in order, so nothing is stored
+        return range(self.next_action, len(state.action_set))
+
+    @property
+    def visits(self):
+        # Visit count, kept in the parent's child_visits so selection scans all siblings at once
+        parent = self.parent
+        return self.own_visits if parent is None else parent.child_visits[self.index]
+
+    @visits.setter
+    def visits(self, value):
+        # Set the visit count where it is kept
+        parent = self.parent
+        if parent is None:
+            self.own_visits = value
+        else:
+            parent.child_visits[self.index] = value
 
-    def init_unexplored(self):
-        # Initialize unexplored actions for the state
-        self.unexplored = list(range(len(state.action_set)))
+    @property
+    def cost(self):
+        # Sum of the rollout costs, kept in the parent's child_cost
+        parent = self.parent
+        return self.own_cost if parent is None else parent.child_cost[self.index]
 
-    def add_child(self, child):
-        # Add a child state
+    @cost.setter
+    def cost(self, value):
+        # Set the cost sum where it is kept
+        parent = self.parent
+        if parent is None:
+            self.own_cost = value
+        else:
+            parent.child_cost[self.index] = value
+
+    def add_child(self, child, visits=0, cost=0.0):
+        # Add a child state with the given starting statistics
+        if self.child_visits is None:
+            self.child_visits = array("q")
+            self.child_cost = array("d")
+        child.parent = self
+        child.index = len(self.children)
         self.children.append(child)
-        self.count_child += 1
+        self.child_visits.append(visits)
+        self.child_cost.append(cost)
+
+    def clear_children(self):
+        # Drop all children together with their statistics, so all actions are expanded again
+        self.children = []
+        self.child_visits = None
+        self.child_cost = None
+        self.next_action = 0
+
+    def remove_children(self, indices):
+        # Drop the children at the given positions together with their statistics
+        keep = [index for index in range(len(self.children)) if index not in indices]
+        if not keep:
+            self.clear_children()
+            return
+        self.children = [self.children[index] for index in keep]
+        self.child_visits = array("q", [self.child_visits[index] for index in keep])
+        self.child_cost = array("d", [self.child_cost[index] for index in keep])
+        for index, child in enumerate(self.children):
+            child.index = index
+
+    def new_child(self, delta, action=None):
+        # Create a child node that shares static data with this node and stores only its move delta
+        child = state.__new__(state)
+        child.blocks = None
+        child.own_visits = 0
+        child.own_cost = 0.0
+        child.action = action
+        child.next_action = 0
+        child.child_visits = None
+        child.child_cost = None
+        child.children = []
+        child.penalty = self.penalty
+        child.level = self.level + 1
+        child.wire_cost = self.wire_cost
+        child.overlap_total = self.overlap_total
+        child.delta = delta
+        child.journal = None
+        child.key = self.key
+        child.grid = None
+        self.add_child(child, self.visits, self.cost)
+        return child
+
+    def tree_size(self):
+        # Number of nodes and of stored port moves in the subtree rooted at this node
+        nodes = moves = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            moves += len(node.delta)
+            stack.extend(node.children)
+        return nodes, moves
 
     def get_key(self):
-        # Generate a unique key for the state
-        key = ""
+        # Generate the 64-bit Zobrist hash of the placement
+        key = 0
         for block in self.blocks:
-            key += block.get_key()
+            key ^= block.zobrist
         return key
 
+    def child_stats(self):
+        # NumPy views of the children's visits, with unvisited children counted as 1e-10 visits, and cost sums.
+        # Returns None without NumPy, and selection then always uses the Python loop.
+        try:
+            import numpy as np
+        except ImportError:
+            state.vector_fanout = math.inf
+            return None
+        visits = np.frombuffer(self.child_visits, dtype=np.int64)
+        return np.where(visits > 0, visits, 1e-10), np.frombuffer(self.child_cost, dtype=np.float64)
+
     def best_child_traverse(self):
-        # Choose the best child for traversal based on some metric
-        value = -1e12
+        # Choose the child with the lowest mean cost
+        stats = self.child_stats() if len(self.children) >= state.vector_fanout else None
+        if stats is not None:
+            visits, cost = stats
+            return self.children[int((-(cost / visits)).argmax())]
+        best_value = None
         pos = 0
-        for index, child in enumerate(self.children):
-            curr_value = child.get_state_traverse_value()
-            if curr_value > value:
-                value = curr_value
-                pos = index 
+        for index, (visits, cost) in enumerate(zip(self.child_visits, self.child_cost)):
+            value = -(cost / (visits if visits > 0 else 1e-10))
+            if best_value is None or value > best_value:
+                best_value = value
+                pos = index
         return self.children[pos]
 
     def best_child(self):
-        # Choose the best child based on state value
-        value = -1e12
+        # Choose the child with the highest UCB value, computed for all children at once on wide nodes
+        scale = 2 * math.log(block_ip.global_t)
+        stats = self.child_stats() if len(self.children) >= state.vector_fanout else None
+        if stats is not None:
+            visits, cost = stats
+            return self.children[int((-(cost / visits) + self.eps * (scale / visits) ** 0.5).argmax())]
+        best_value = None
         pos = 0
-        for index, child in enumerate(self.children):
-            curr_value = child.get_state_value()
-            if curr_value > value:
-                value = curr_value
-                pos = index 
+        for index, (visits, cost) in enumerate(zip(self.child_visits, self.child_cost)):
+            visits = visits if visits > 0 else 1e-10
+            value = -(cost / visits) + self.eps * (scale / visits) ** 0.5
+            if best_value is None or value > best_value:
+                best_value = value
+                pos = index
         return self.children[pos]
-    
-    def get_state_traverse_value(self):
-        # Calculate state value for traversal
-        global global_t
-        curr_visits = self.visits if self.visits > 0 else 0.0000000001
-        return -(self.cost / curr_visits)
-
-    def get_state_value(self):
-        # Calculate state value
-        global global_t
-        curr_visits = self.visits if self.visits > 0 else 0.0000000001
-        return -(self.cost / curr_visits) + self.eps * (2 * math.log(global_t) / curr_visits) ** 0.5
-    
-    def visit(self):
-        # Increment visit count
-        self.visits += 1
-        
+
     def cost_block_port(self, block_name, port_name):
         # Calculate cost for a specific block and port
-        curr_cost = 0.0
-        for con, freq in state.map_connectivity[block_name + '.' + port_name]:
-            IP, port2 = con.split(".")
-            curr_cost += self.get_dist(state.map_blocks[block_name], state.map_blocks[IP], port_name, port2)
-        return curr_cost
+        block_index = state.map_blocks[block_name]
+        port_index = self.blocks[block_index].get_port_index(port_name)
+        return self.cost_port(state.connectivity.get_port_id(block_index, port_index))
+
+    def cost_port(self, port_id):
+        # Calculate cost for a port given its integer id in the connectivity index
+        return state.connectivity.port_cost(self.blocks, port_id)
+
+    def move_port(self, block_index, port_index, direct):
+        # Move a port and return the change in total cost, keeping the running cost up to date
+        block = self.blocks[block_index]
+        edge, pos = block.get_port_location(port_index)
+        new_edge, new_pos = block.next_position(edge, pos, block.get_port_by_index(port_index).get_port_length(), direct)
+        return self.place_port(block_index, port_index, new_edge, new_pos)
+
+    def place_port(self, block_index, port_index, edge, pos):
+        # Put a port at the given edge and position and return the change in total cost
+        block = self.blocks[block_index]
+        if self.journal is not None and (block_index, port_index) not in self.journal:
+            self.journal[(block_index, port_index)] = block.get_port_location(port_index)
+        port_id = state.connectivity.get_port_id(block_index, port_index)
+        curr_port_cost = self.cost_port(port_id)
+        curr_overlap_cost = block.overlap_cost
+        if self.grid is not None:
+            curr_overlap_cost += self.grid.remove(port_id)
+        block.place_port(port_index, edge, pos)
+        wire_delta = self.cost_port(port_id) - curr_port_cost
+        overlap_delta = block.overlap_cost - curr_overlap_cost
+        if self.grid is not None:
+            overlap_delta += self.grid.insert(port_id, block_index, block.get_port_pos_by_index(port_index))
+        if self.wire_cost is not None:
+            self.wire_cost += wire_delta
+            self.overlap_total += overlap_delta
+        return wire_delta + self.penalty * overlap_delta
+
+    def swap_ports(self, block_index, port1, port2):
+        # Exchange the locations of two ports of a block and return the change in total cost
+        block = self.blocks[block_index]
+        edge1, pos1 = block.get_port_location(port1)
+        edge2, pos2 = block.get_port_location(port2)
+        delta = self.place_port(block_index, port1, *block.fit_location(edge2, pos2, block.get_port_by_index(port1).get_port_length()))
+        delta += self.place_port(block_index, port2, *block.fit_location(edge1, pos1, block.get_port_by_index(port2).get_port_length()))
+        return delta
+
+    def jump_port(self, block_index, port_index, edge, pos):
+        # Move a port straight to an edge and position, clamped onto the edge, and return the change in total cost
+        block = self.blocks[block_index]
+        return self.place_port(block_index, port_index, *block.fit_location(edge, pos, block.get_port_by_index(port_index).get_port_length()))
+
+    def shift_ports(self, block_index, port_indices, distance):
+        # Slide a group of ports the same distance along the block perimeter and return the change in total cost
+        block = self.blocks[block_index]
+        offsets = [block.perimeter_offset(*block.get_port_location(port_index)) for port_index in port_indices]
+        delta = 0
+        for port_index, offset in zip(port_indices, offsets):
+            delta += self.jump_port(block_index, port_index, *block.perimeter_location((offset + distance) % block.perimeter[-1]))
+        return delta
+
+    def start_journal(self):
+        # Start recording port moves
+        self.journal = {}
+
+    def stop_journal(self):
+        # Stop recording and return the net port moves as [block index, port index, old edge, old pos, new edge, new pos]
+        delta = []
+        for (block_index, port_index), (edge, pos) in self.journal.items():
+            new_edge, new_pos = self.blocks[block_index].get_port_location(port_index)
+            if new_edge != edge or new_pos != pos:
+                delta.append([block_index, port_index, edge, pos, new_edge, new_pos])
+        self.journal = None
+        return delta
 
-    def calculate_dist(self):
+    @staticmethod
+    def merge_delta(delta, later):
+        # Combine two consecutive move deltas into one
+        moves = {}
+        for move in delta:
+            moves[(move[0], move[1])] = list(move)
+        for block_index, port_index, edge, pos, new_edge, new_pos in later:
+            move = moves.setdefault((block_index, port_index), [block_index, port_index, edge, pos, new_edge, new_pos])
+            move[4], move[5] = new_edge, new_pos
+        return [move for move in moves.values() if move[2] != move[4] or move[3] != move[5]]
+
+    def apply_delta(self, delta):
+        # Replay a move delta onto this placement
+        for block_index, port_index, edge, pos, new_edge, new_pos in delta:
+            self.place_port(block_index, port_index, new_edge, new_pos)
+
+    def undo_delta(self, delta):
+        # Revert a move delta previously applied to this placement
+        for block_index, port_index, edge, pos, new_edge, new_pos in reversed(delta):
+            self.place_port(block_index, port_index, edge, pos)
+
+    def get_port_locations(self):
+        # Return the [edge, pos] of every port of every block
+        return [[block.get_port_location(port_index) for port_index in range(len(block.block_ports))] for block in self.blocks]
+
+    def set_port_locations(self, locations):
+        # Move every port to the location given by get_port_locations and return the total cost
+        for block_index, block_locations in enumerate(locations):
+            for port_index, (edge, pos) in enumerate(block_locations):
+                self.place_port(block_index, port_index, edge, pos)
+        return self.get_total_cost()
+
+    def get_layout(self):
+        # Return the shared ArrayLayout when the blocks are array backed, else None
+        return self.blocks[0].layout if self.blocks else None
+
+    def calculate_dist(self, is_HPWL=False):
         # Calculate total distance for all connections
-        self.total_cost = 0.0
-        for con1 in state.map_connectivity.keys():
-            ip1, port1 = con1.split('.')
-            for ip_port in state.map_connectivity[con1]:
-                ip2, port2 = ip_port[0].split('.')
-                self.total_cost += self.get_dist(state.map_blocks[ip1], state.map_blocks[ip2], port1, port2)
-        self.total_cost /= 2.0
-        return self.total_cost
+        layout = self.get_layout()
+        if layout is not None:
+            return layout.total_dist(is_HPWL)
+        return state.connectivity.total_dist(self.blocks, is_HPWL)
 
     def get_dist(self, block1_index, block2_index, port1, port2, is_HPWL=False):
         # Calculate Euclidean distance or HPWL between two ports
-        x1_l, y1_l, x1_r, y1_r = self.blocks[block1_index].get_port_pos(port1)
-        x2_l, y2_l, x2_r, y2_r = self.blocks[block2_index].get_port_pos(port2)
-        x1, y1 = (x1_l + x1_r) / 2.0, (y1_l + y1_r) / 2.0
-        x2, y2 = (x2_l + x2_r) / 2.0, (y2_l + y2_r) / 2.0
+        x1, y1 = self.blocks[block1_index].get_port_center(port1)
+        x2, y2 = self.blocks[block2_index].get_port_center(port2)
 
         if is_HPWL:
             return abs(x2 - x1) + abs(y2 - y1)
@@ -118,16 +329,38 @@ class state:
 
     def get_overlap_cost(self):
         # Calculate overlap cost for the current state
+        layout = self.get_layout()
+        if layout is not None:
+            for block, overlap in zip(self.blocks, layout.block_overlaps()):
+                block.overlap_cost = overlap
         overlap_cost = 0
         for block in self.blocks:
             overlap_cost += block.total_overlap()
         return overlap_cost
 
+    def refresh_cost(self):
+        # Recompute the running connection and overlap costs from scratch
+        if state.telemetry is not None and state.telemetry.enabled:
+            state.telemetry.count("cost_evaluations")
+        self.wire_cost = self.calculate_dist()
+        self.overlap_total = self.get_overlap_cost()
+        if state.collision_cell is not None:
+            self.build_grid()
+            self.overlap_total += self.grid.total
+
+    def build_grid(self):
+        # Index the rectangles of all ports in a PortGrid for cross-block collision costs
+        self.grid = PortGrid(state.collision_cell)
+        for block_index, block in enumerate(self.blocks):
+            for port_index in range(len(block.block_ports)):
+                port_id = state.connectivity.get_port_id(block_index, port_index)
+                self.grid.insert(port_id, block_index, block.get_port_pos_by_index(port_index))
+
     def get_total_cost(self):
         # Calculate total cost combining connection and overlap costs
-        connection_cost = self.calculate_dist()
-        overlap_cost = self.get_overlap_cost()
-        return connection_cost + self.penalty * overlap_cost
+        if self.wire_cost is None:
+            self.refresh_cost()
+        return self.wire_cost + self.penalty * self.overlap_total
     
     def export_port_positions(self, file_path="tests/dataset_3_output.csv"):
         # Export port positions to a specified file
@@ -0,0 +1,132 @@
+import sys
+import time
+import atexit
+from contextlib import contextmanager
+
+class Telemetry:
+    # Counters and timers for the optimization hot paths, reported to pluggable sinks. Without sinks it is
+    # disabled, and callers check `enabled` before doing any work, so the overhead is one attribute test.
+
+    def __init__(self, sinks=(), interval=1.0):
+        # Initialize the telemetry with the sinks to report to and the minimum seconds between progress events.
+        self.sinks = list(sinks)
+        self.enabled = bool(self.sinks)
+        self.interval = interval
+        self.counters = {}
+        self.timers = {}  # Name -> [total seconds, number of timed sections]
+        self.start = time.perf_counter()
+        self.last_progress = self.start
+        self.closed = False
+        if self.enabled:
+            atexit.register(self.close)
+
+    def count(self, name, n=1):
+        # Add n to a counter.
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_time(self, name, seconds):
+        # Add one timed section to a timer.
+        timer = self.timers.setdefault(name, [0.0, 0])
+        timer[0] += seconds
+        timer[1] += 1
+
+    @contextmanager
+    def timer(self, name):
+        # Time the body of a with statement.
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        # Return the elapsed time, counters and timers as a dict.
+        return {"elapsed": time.perf_counter() - self.start, "counters": dict(self.counters),
+                "timers": {name: {"seconds": seconds, "count": count} for name, (seconds, count) in self.timers.items()}}
+
+    def emit(self, event):
+        # Send an event to every sink.
+        for sink in self.sinks:
+            sink.emit(event)
+
+    def progress(self, force=False, **fields):
+        # Emit a progress event with the given fields if interval seconds passed since the last one.
+        now = time.perf_counter()
+        if force or now - self.last_progress >= self.interval:
+            self.last_progress = now
+            event = self.snapshot()
+            event.update(fields)
+            event["event"] = "progress"
+            self.emit(event)
+
+    def trace(self, name, values):
+        # Emit a sampled trace, such as annealing costs.
+        self.emit({"event": "trace", "name": name, "elapsed": time.perf_counter() - self.start, "values": list(values)})
+
+    def close(self):
+        # Emit the summary event once and close the sinks.
+        if self.closed or not self.enabled:
+            return
+        self.closed = True
+        event = self.snapshot()
+        event["event"] = "summary"
+        self.emit(event)
+        for sink in self.sinks:
+            sink.close()
+
+class CallbackSink:
+    # Calls a function with every progress event.
+
+    def __init__(self, callback, events=("progress",)):
+        # Initialize the sink with the function and the event kinds to pass to it.
+        self.callback = callback
+        self.events = events
+
+    def emit(self, event):
+        # Pass the event to the callback if it is one of the selected kinds.
+        if event["event"] in self.events:
+            self.callback(event)
+
+    def close(self):
+        # Nothing to release.
+        pass
+
+class JsonLinesSink:
+    # Appends every event as one JSON line to a file.
+
+    def __init__(self, file_path):
+        # Open the log file for appending.
+        import json
+        self.dumps = json.dumps
+        self.file = open(file_path, "a")
+
+    def emit(self, event):
+        # Write the event and flush it so the log can be followed while the run is going.
+        self.file.write(self.dumps(event) + "\n")
+        self.file.flush()
+
+    def close(self):
+        # Close the log file.
+        self.file.close()
+
+class SummarySink:
+    # Prints the counters and timers of the summary event.
+
+    def __init__(self, stream=None):
+        # Initialize the sink with the stream to print to, stderr by default.
+        self.stream = stream
+
+    def emit(self, event):
+        # Print the summary event and ignore the others.
+        if event["event"] != "summary":
+            return
+        stream = self.stream or sys.stderr
+        stream.write(f"telemetry summary after {event['elapsed']:.3f}s\n")
+        for name, value in sorted(event["counters"].items()):
+            stream.write(f"  {name:<24} {value}\n")
+        for name, timer in sorted(event["timers"].items()):
+            stream.write(f"  {name:<24} {timer['seconds']:.3f}s in {timer['count']} sections\n")
+
+    def close(self):
+        # Nothing to release.
+        pass
@@ -0,0 +1,134 @@
+import math
+import time
+import random
+import multiprocessing
+import block_ip
+from parallel_mcts import design_copy
+
+def run_replica(obj, seed, conn):
+    # Serve one annealing replica: load a placement, run Metropolis sweeps at a given temperature and
+    # report the best placement seen. Moves are drawn like simulated_annealing's, including obj.move_mix.
+    # The best cost is checked after every improving move, and the journal of moves made since the best
+    # placement lets it be recovered without copying it each time.
+    random.seed(seed)
+    obj.set_root()
+    placement = obj.scratch
+    port_actions = obj.port_actions
+    move_mix = obj.move_mix
+    best_cost = None
+    while True:
+        message = conn.recv()
+        if message[0] == "load":
+            kind, locations, penalty, global_t = message
+            block_ip.global_t = global_t
+            placement.penalty = penalty
+            placement.journal = None
+            best_cost = placement.set_port_locations(locations)
+            placement.start_journal()
+        elif message[0] == "run":
+            kind, temperature, steps, deadline = message
+            done = steps
+            for step in range(steps):
+                if deadline is not None and step & 255 == 0 and time.perf_counter() >= deadline:
+                    done = step
+                    break
+                block_id, port_index, direct = random.choice(port_actions)
+                large = move_mix.propose(placement, block_id, port_index) if move_mix is not None else None
+                if large is None:
+                    edge, pos = placement.blocks[block_id].get_port_location(port_index)
+                    delta = placement.move_port(block_id, port_index, direct)
+                else:
+                    delta, undo = large
+                # exp(-delta / T) is below 1e-13 past 30 T, so skip the exponential there.
+                if delta > 0 and (delta > 30 * temperature or random.random() >= math.exp(-delta / temperature)):
+                    if large is None:
+                        placement.place_port(block_id, port_index, edge, pos)
+                    else:
+                        move_mix.undo(placement, undo)
+                elif delta < 0:
+                    cost = placement.get_total_cost()
+                    if cost < best_cost:
+                        best_cost = cost
+                        placement.start_journal()
+            conn.send((placement.get_total_cost(), done))
+        elif message[0] == "best":
+            # Step back to the best placement, read it, and step forward again keeping the journal.
+            delta = placement.stop_journal()
+            placement.undo_delta(delta)
+            best_locations = placement.get_port_locations()
+            placement.apply_delta(delta)
+            placement.start_journal()
+            for block_index, port_index, edge, pos, new_edge, new_pos in delta:
+                placement.journal[(block_index, port_index)] = (edge, pos)
+            conn.send((best_cost, best_locations))
+        else:
+            break
+    conn.close()
+
+class ParallelTempering:
+    # Replica-exchange annealing: one replica per worker process at each temperature of a geometric
+    # ladder, with Metropolis swaps between neighboring temperatures every exchange_interval moves.
+
+    def __init__(self, obj, replicas=4, t_min=1.0, t_max=1000.0, exchange_interval=100, seed=0):
+        # Start the replica workers for a preprocessed MCTS.
+        self.exchange_interval = exchange_interval
+        if replicas > 1:
+            ratio = (t_max / t_min) ** (1.0 / (replicas - 1))
+            self.temperatures = [t_min * ratio ** k for k in range(replicas)]
+        else:
+            self.temperatures = [t_min]
+        self.rng = random.Random(seed)
+        self.moves = 0  # Moves made by all replicas so far
+        self.conns = []
+        self.procs = []
+        worker_obj = design_copy(obj)
+        for replica in range(replicas):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=run_replica, args=(worker_obj, seed + replica, child_conn), daemon=True)
+            proc.start()
+            child_conn.close()
+            self.conns.append(parent_conn)
+            self.procs.append(proc)
+
+    def anneal(self, curr_state, iterations=100000, deadline=None, budget=None):
+        # Run every replica for the given number of moves starting from curr_state, then move curr_state
+        # to the best placement seen by any replica and return its total cost. Replicas stop at deadline,
+        # a time.perf_counter() value (a system-wide monotonic clock on Linux), and once all of them together
+        # made budget moves, rounded up to a whole move per replica.
+        if budget is not None:
+            iterations = min(iterations, -(-budget // len(self.conns)))
+        locations = curr_state.get_port_locations()
+        for conn in self.conns:
+            conn.send(("load", locations, curr_state.penalty, block_ip.global_t))
+        slot_replica = list(range(len(self.conns)))  # Replica running at each temperature
+        costs = [curr_state.get_total_cost()] * len(self.conns)
+        parity = 0
+        for start in range(0, iterations, self.exchange_interval):
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            steps = min(self.exchange_interval, iterations - start)
+            for slot, replica in enumerate(slot_replica):
+                self.conns[replica].send(("run", self.temperatures[slot], steps, deadline))
+            for replica, conn in enumerate(self.conns):
+                costs[replica], done = conn.recv()
+                self.moves += done
+            for slot in range(parity, len(slot_replica) - 1, 2):
+                low, high = slot_replica[slot], slot_replica[slot + 1]
+                x = (costs[low] - costs[high]) * (1.0 / self.temperatures[slot] - 1.0 / self.temperatures[slot + 1])
+                if x >= 0 or self.rng.random() < math.exp(x):
+                    slot_replica[slot], slot_replica[slot + 1] = high, low
+            parity = 1 - parity
+
+        for conn in self.conns:
+            conn.send(("best",))
+        best_cost, best_locations = min((conn.recv() for conn in self.conns), key=lambda best: best[0])
+        return curr_state.set_port_locations(best_locations)
+
+    def close(self):
+        # Stop the replica workers.
+        for conn in self.conns:
+            conn.send(("stop",))
+        for proc in self.procs:
+            proc.join()
+        self.conns = []
+        self.procs = []
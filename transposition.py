@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+MASK = (1 << 64) - 1
+
+def zobrist_key(block_seed, port_index, edge, pos):
+    # 64-bit Zobrist key of a port at (edge, pos): the splitmix64 finalizer of the packed coordinates.
+    x = (block_seed * 0x9E3779B97F4A7C15 + port_index * 0xD6E8FEB86659FD93 + edge * 0xA0761D6478BD642F + pos) & MASK
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK
+    return x ^ (x >> 31)
+
+class TranspositionTable:
+    # Bounded map from placement hashes to [visits, cost, anneal cost, anneal delta], evicting the least
+    # recently used entries once capacity is reached or the anneal deltas hold more than max_moves port moves.
+
+    def __init__(self, capacity=100000, max_moves=None):
+        # Initialize an empty table.
+        self.capacity = capacity
+        self.max_moves = max_moves
+        self.moves = 0  # Port moves stored in the anneal deltas
+        self.entries = OrderedDict()
+        self.hits = 0
+
+    def __len__(self):
+        # Return the number of stored placements.
+        return len(self.entries)
+
+    def get(self, key):
+        # Return the entry of a placement hash, or None when it is not stored.
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        # Store the entry of a placement hash.
+        previous = self.entries.get(key)
+        if previous is not None:
+            self.moves -= len(previous[3])
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.moves += len(entry[3])
+        while len(self.entries) > self.capacity or (self.max_moves is not None and self.moves > self.max_moves
+                                                    and len(self.entries) > 1):
+            self.moves -= len(self.entries.popitem(last=False)[1][3])
+
+    def add_visit(self, key, cost):
+        # Add a backed-up cost to the statistics of a placement hash, if it is stored.
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[0] += 1
+            entry[1] += cost
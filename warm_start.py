@@ -0,0 +1,64 @@
+from port import Port
+
+def nearest_location(block, port_len, x, y):
+    # Edge and integer position that put a port's center closest to (x, y) on the block's perimeter.
+    half_width = Port.port_width / 2.0
+    best = None
+    for edge, (corner_x, corner_y, ux, uy, nx, ny) in enumerate(block.edge_geometry):
+        length = block.edges[edge][0]
+        along = (x - corner_x) * ux + (y - corner_y) * uy
+        pos = int(round(min(max(along - port_len / 2.0, 0), max(length - port_len, 0))))
+        center = pos + port_len / 2.0
+        dx = corner_x + center * ux + half_width * nx - x
+        dy = corner_y + center * uy + half_width * ny - y
+        dist = dx * dx + dy * dy
+        if best is None or dist < best[0]:
+            best = (dist, edge, pos)
+    return best[1], best[2]
+
+def legalize_edges(block):
+    # Remove overlaps along every edge in one forward and one backward sweep, keeping the port order.
+    by_edge = {}
+    for port_index in range(len(block.block_ports)):
+        edge, pos = block.get_port_location(port_index)
+        by_edge.setdefault(edge, []).append([pos, port_index])
+    for edge, ports in by_edge.items():
+        ports.sort()
+        lengths = [block.get_port_by_index(port_index).get_port_length() for pos, port_index in ports]
+        end = 0
+        for entry, port_len in zip(ports, lengths):
+            entry[0] = max(entry[0], end)
+            end = entry[0] + port_len
+        limit = block.edges[edge][0]
+        for entry, port_len in zip(reversed(ports), reversed(lengths)):
+            entry[0] = max(min(entry[0], limit - port_len), 0)
+            limit = entry[0]
+        for pos, port_index in ports:
+            block.place_port(port_index, edge, pos)
+
+def warm_start(block_list, connectivity, rounds=3):
+    # Move every port to the perimeter point of its block closest to the frequency-weighted centroid of
+    # its connected ports, repeated for a few rounds, then legalize overlaps along each edge.
+    port_block = connectivity.port_block
+    port_index = connectivity.port_index
+    offsets = connectivity.offsets
+    neighbors = connectivity.neighbors
+    freqs = connectivity.freqs
+    for round_index in range(rounds):
+        centers = connectivity.port_centers(block_list)
+        moves = []
+        for port_id in range(connectivity.num_ports()):
+            weight = sum_x = sum_y = 0.0
+            for neighbor, freq in zip(neighbors[offsets[port_id]:offsets[port_id + 1]], freqs[offsets[port_id]:offsets[port_id + 1]]):
+                x, y = centers[neighbor]
+                weight += freq
+                sum_x += freq * x
+                sum_y += freq * y
+            if weight > 0:
+                block = block_list[port_block[port_id]]
+                port_len = block.get_port_by_index(port_index[port_id]).get_port_length()
+                moves.append((block, port_index[port_id], nearest_location(block, port_len, sum_x / weight, sum_y / weight)))
+        for block, index, (edge, pos) in moves:
+            block.place_port(index, edge, pos)
+    for block in block_list:
+        legalize_edges(block)